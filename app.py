@@ -3,16 +3,46 @@
 #----------------------------------------------------------------------------#
 
 import json
+import os
+import time
+import traceback
+import click
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+import hashlib
+import math
+import hmac
+import heapq
+import itertools
+import threading
+import tracemalloc
+from datetime import datetime, timedelta
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, send_from_directory, stream_with_context, g, get_flashed_messages
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import logging
 from logging import Formatter, FileHandler
+from jinja2 import FileSystemBytecodeCache
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy.dialects import postgresql
 from flask_wtf import Form
+from werkzeug.datastructures import MultiDict
 from forms import *
+from thumbnails import ThumbnailStore, FORMATS, KEY as THUMBNAIL_KEY, VARIANT as THUMBNAIL_VARIANT
+from prefix_index import PrefixIndex
+from topn import TopN, Refresher
+from warmup import AccessList, Warmup
+from duplicates import DuplicateIndex, shingles, place
+from notifications import ChangeListener
+from events import EventHub
+from ical import calendar
+from recurrence import occurrences, parse_dates, FREQUENCIES
+from profiler import Sampler, write_profile, recent_profiles
+from ratelimit import MemoryBackend, PostgresBackend, TimedQueuePool, InFlight
+from viewmodels import ShowRow, NearbyShow, ArtistShow, VenueShow, Listing, NameRow, StatRow, dumps
+from sqlalchemy.exc import IntegrityError
+from geo import haversine, encode as geohash_encode, neighbourhood, precision_for_radius, load_gazetteer
 import sys
 #----------------------------------------------------------------------------#
 # App Config.
@@ -24,6 +54,16 @@ moment = Moment(app)
 #connect to a local postgresql database
 app.config.from_object('config')
 
+# share compiled templates between workers so they don't recompile on boot
+if app.config['JINJA_BYTECODE_CACHE_DIR']:
+  os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+  app.jinja_options = dict(app.jinja_options,
+                           bytecode_cache=FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR']))
+
+# the pool times its checkouts, load shedding reads the average wait
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+                                               poolclass=TimedQueuePool)
+
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 
@@ -32,6 +72,17 @@ migrate = Migrate(app, db)
 # Models.
 #----------------------------------------------------------------------------#
 
+# genres_list in forms.py is the genre catalog: each genre's position in it
+# is its bit in genre_mask, so new genres go at the end
+GENRE_BITS = {name: 1 << bit for bit, (name, _) in enumerate(genres_list)}
+
+def genres_mask(genres):
+  mask = 0
+  for genre in genres or ():
+    mask |= GENRE_BITS.get(genre, 0)
+  return mask
+
+
 class Venue(db.Model):
   __tablename__ = 'venues'
 
@@ -47,9 +98,25 @@ class Venue(db.Model):
   website  =   db.Column(db.String(120))
   seeking_talent  = db.Column(db.Boolean)
   seeking_description  = db.Column(db.String(500))
+  genre_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  latitude  = db.Column(db.Float)
+  longitude = db.Column(db.Float)
+  geohash   = db.Column(db.String(12))
 
   show = db.relationship('Shows', backref='venues', lazy=True)
 
+  __table_args__ = (
+    db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+    db.Index('ix_venues_state_city', 'state', 'city'),
+    # prefix matches on geohash need pattern ops to use the index
+    db.Index('ix_venues_geohash', 'geohash', postgresql_ops={'geohash': 'varchar_pattern_ops'}),
+  )
+
+  @db.validates('genres')
+  def validate_genres(self, key, genres):
+    self.genre_mask = genres_mask(genres)
+    return genres
+
   def __repr__(self):
     return f'<Venue {self.id} {self.name}>'
 
@@ -68,9 +135,20 @@ class Artist(db.Model):
   website  = db.Column(db.String(120))
   seeking_venue  = db.Column(db.Boolean)
   seeking_description  =  db.Column(db.String(500))
+  genre_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
   show = db.relationship('Shows', backref='artists', lazy=True)
 
+  __table_args__ = (
+    db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+    db.Index('ix_artists_state_city', 'state', 'city'),
+  )
+
+  @db.validates('genres')
+  def validate_genres(self, key, genres):
+    self.genre_mask = genres_mask(genres)
+    return genres
+
   def __repr__(self):
     return f'<Artist {self.id} {self.name}>'
 
@@ -82,18 +160,139 @@ class Shows(db.Model):
   venue_id   = db.Column(db.Integer,db.ForeignKey('venues.id'),  nullable=False)
   artist_id  = db.Column(db.Integer,db.ForeignKey('artists.id'), nullable=False)
   start_time = db.Column(db.DateTime,nullable=False)
+  series_id  = db.Column(db.Integer, db.ForeignKey('show_series.id', ondelete='SET NULL'))
+
+  __table_args__ = (
+    db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_shows_series_id_start_time', 'series_id', 'start_time'),
+  )
 
   def __repr__(self):
     return f'<Show {self.id} {self.venue_id} {self.artist_id}>'
 
 
+class ShowSeries(db.Model):
+  # a recurring show; every occurrence is also a row in shows
+  __tablename__ = 'show_series'
+
+  id         = db.Column(db.Integer, primary_key=True)
+  venue_id   = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
+  artist_id  = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
+  start_time = db.Column(db.DateTime, nullable=False)
+  freq       = db.Column(db.String(10), nullable=False)
+  interval   = db.Column(db.Integer, nullable=False, default=1)
+  until      = db.Column(db.Date)
+  count      = db.Column(db.Integer)
+  exceptions = db.Column(db.ARRAY(db.Date), nullable=False, default=list, server_default='{}')
+
+  shows = db.relationship('Shows', backref='series', lazy=True)
+
+  def occurrences(self):
+    return occurrences(self.start_time, self.freq, self.interval, self.until, self.count,
+                       self.exceptions, limit=app.config['SERIES_MAX_OCCURRENCES'])
+
+  def __repr__(self):
+    return f'<ShowSeries {self.id} {self.freq} {self.venue_id} {self.artist_id}>'
+
+
+# genre of the rollup rows that count every show once, whatever its genres
+ALL_GENRES = ''
+
+class ShowRollup(db.Model):
+  # show counts per day and month, venue, artist and genre, kept up to date by
+  # triggers on shows, venues and artists (see migration 5c9e2d7a4f16)
+  __tablename__ = 'show_rollups'
+
+  period       = db.Column(db.String(5), primary_key=True)
+  period_start = db.Column(db.Date, primary_key=True)
+  venue_id     = db.Column(db.Integer, primary_key=True)
+  artist_id    = db.Column(db.Integer, primary_key=True)
+  genre        = db.Column(db.String(120), primary_key=True)
+  city         = db.Column(db.String(120), nullable=False)
+  state        = db.Column(db.String(120), nullable=False)
+  show_count   = db.Column(db.Integer, nullable=False)
+
+  __table_args__ = (
+    db.Index('ix_show_rollups_period_genre_start', 'period', 'genre', 'period_start'),
+    # buckets emptied by deletes, cleared by the same trigger
+    db.Index('ix_show_rollups_empty', 'period', postgresql_where=db.text('show_count <= 0')),
+    db.Index('ix_show_rollups_venue_id', 'venue_id'),
+    db.Index('ix_show_rollups_artist_id', 'artist_id'),
+  )
+
+  def __repr__(self):
+    return f'<ShowRollup {self.period} {self.period_start} {self.venue_id} {self.artist_id} {self.genre!r}>'
+
+
+class RateLimit(db.Model):
+  # token buckets shared by all workers when RATE_LIMIT_BACKEND = 'postgres'
+  __tablename__ = 'rate_limits'
+
+  key        = db.Column(db.String(200), primary_key=True)
+  tokens     = db.Column(db.Float, nullable=False)
+  allowed    = db.Column(db.Boolean, nullable=False)
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+  # losing the buckets in a crash only resets them
+  __table_args__ = {'prefixes': ['UNLOGGED']}
+
+  def __repr__(self):
+    return f'<RateLimit {self.key} {self.tokens}>'
+
+
+class CalendarFeed(db.Model):
+  __tablename__ = 'calendar_feeds'
+
+  entity     = db.Column(db.String(20), primary_key=True)
+  entity_id  = db.Column(db.Integer, primary_key=True)
+  body       = db.Column(db.Text, nullable=False)
+  etag       = db.Column(db.String(40), nullable=False)
+  updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+  def __repr__(self):
+    return f'<CalendarFeed {self.entity} {self.entity_id}>'
+
+
+class CalendarFeedVersion(db.Model):
+  # bumped by the triggers that invalidate a feed, see store_calendar_feed()
+  __tablename__ = 'calendar_feed_versions'
+
+  entity    = db.Column(db.String(20), primary_key=True)
+  entity_id = db.Column(db.Integer, primary_key=True)
+  version   = db.Column(db.BigInteger, nullable=False)
+
+  def __repr__(self):
+    return f'<CalendarFeedVersion {self.entity} {self.entity_id} {self.version}>'
+
+
+class Job(db.Model):
+  __tablename__ = 'jobs'
+
+  id       = db.Column(db.Integer, primary_key=True)
+  kind     = db.Column(db.String(120), nullable=False)
+  payload  = db.Column(db.JSON, nullable=False)
+  status   = db.Column(db.String(20), nullable=False, default='pending')
+  attempts = db.Column(db.Integer, nullable=False, default=0)
+  run_at   = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+  last_error = db.Column(db.Text)
+  created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+  __table_args__ = (
+    db.Index('ix_jobs_pending_run_at', 'run_at', postgresql_where=db.text("status = 'pending'")),
+  )
+
+  def __repr__(self):
+    return f'<Job {self.id} {self.kind} {self.status}>'
+
+
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
+  date = value if isinstance(value, datetime) else dateutil.parser.parse(value)
   if format == 'full':
       format="EEEE MMMM, d, y 'at' h:mma"
   elif format == 'medium':
@@ -102,14 +301,984 @@ def format_datetime(value, format='medium'):
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+def stream_template(template_name, **context):
+  # long list pages: send the first bytes while the rest is still rendering
+  if not app.config['STREAM_LIST_PAGES']:
+    return render_template(template_name, **context)
+  app.update_template_context(context)
+  # the session is saved before the body streams, so pop the flashes now;
+  # the layout's get_flashed_messages() gets them from the request context
+  get_flashed_messages()
+  stream = app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+  return Response(stream_with_context(stream))
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def show_rows():
+  # columns in ShowRow order, no ORM objects are loaded
+  return db.session.query(Shows.id, Shows.venue_id, Venue.name, Shows.artist_id, Artist.name,
+                          Artist.image_link, Shows.start_time, Shows.series_id) \
+                   .join(Venue, Shows.venue_id == Venue.id) \
+                   .join(Artist, Shows.artist_id == Artist.id)
+
+def upcoming_show_counts(column):
+  return db.session.query(column.label('id'), db.func.count().label('num_upcoming_shows')) \
+                   .filter(Shows.start_time > datetime.now()).group_by(column).subquery()
+
+def json_response(value, status=200):
+  return Response(dumps(value), status=status, mimetype='application/json')
+
+#----------------------------------------------------------------------------#
+# Recurring shows.
+#----------------------------------------------------------------------------#
+
+def series_rule(form):
+  # the recurrence fields of the submitted show form, None for a one-off
+  # show; ValueError when they don't pass the form's validators
+  form.validate()
+  errors = {name: form.errors[name] for name in ('repeat', 'interval', 'until', 'count') if name in form.errors}
+  if errors:
+    raise ValueError(errors)
+  if form.repeat.data not in FREQUENCIES:
+    return None
+  rule = {
+    'freq': form.repeat.data,
+    'interval': form.interval.data or 1,
+    'until': form.until.data,
+    'count': form.count.data,
+    'exceptions': parse_dates(form.exceptions.data),
+  }
+  if rule['until'] is None and rule['count'] is None:
+    raise ValueError('a repeating show needs an end date or a number of shows')
+  return rule
+
+def insert_occurrences(series, times):
+  # every occurrence in one multi-row INSERT
+  if times:
+    db.session.execute(Shows.__table__.insert().values([
+      {'venue_id': series.venue_id, 'artist_id': series.artist_id, 'start_time': start_time, 'series_id': series.id}
+      for start_time in times]))
+  return len(times)
+
+def update_future_occurrences(series, rule, start_time):
+  # shows of the series that haven't happened yet follow the edited series:
+  # a new venue, artist or time of day is one UPDATE, a new schedule
+  # replaces them with one DELETE and one INSERT
+  now = datetime.now()
+  future = Shows.query.filter(Shows.series_id == series.id, Shows.start_time >= now)
+  schedule_changed = start_time.date() != series.start_time.date() or \
+    any(getattr(series, key) != value for key, value in rule.items())
+  if schedule_changed:
+    future.delete(synchronize_session=False)
+    for key, value in rule.items():
+      setattr(series, key, value)
+    series.start_time = start_time
+    times = series.occurrences()
+    if not times:
+      raise ValueError('the series has no shows')
+    return insert_occurrences(series, [when for when in times if when >= now])
+  values = {Shows.venue_id: series.venue_id, Shows.artist_id: series.artist_id}
+  if start_time.time() != series.start_time.time():
+    values[Shows.start_time] = db.func.date_trunc('day', Shows.start_time) + \
+      (start_time - datetime.combine(start_time.date(), datetime.min.time()))
+    series.start_time = start_time
+  return future.update(values, synchronize_session=False)
+
+#----------------------------------------------------------------------------#
+# Partial updates.
+#----------------------------------------------------------------------------#
+
+# Edits only write the columns whose value actually changes, and nothing at
+# all when none does. The change notification of an UPDATE lists the
+# columns it changed in "fields", so caches can ignore edits that don't
+# touch what they hold.
+
+EDITABLE_FIELDS = {
+  'venue': ('name', 'city', 'state', 'address', 'phone', 'genres', 'facebook_link', 'image_link',
+            'website', 'seeking_talent', 'seeking_description'),
+  'artist': ('name', 'city', 'state', 'phone', 'genres', 'facebook_link', 'image_link',
+             'website', 'seeking_venue', 'seeking_description'),
+}
+
+def touched(change, *fields):
+  # False only for an UPDATE known to have left all of `fields` alone
+  return change['op'] != 'UPDATE' or 'fields' not in change or any(field in change['fields'] for field in fields)
+
+def blank(value):
+  return None if value == '' else value
+
+def diff_listing(kind, listing, values):
+  # the submitted values are validated on top of the stored ones; returns
+  # the fields whose value changes, and the validation errors among them
+  fields = EDITABLE_FIELDS[kind]
+  form_class = VenueForm if kind == 'venue' else ArtistForm
+  current = {name: getattr(listing, name) for name in fields}
+  submitted = [name for name in values if name in fields]
+  form = form_class(formdata=None, data=dict(current, **{name: values[name] for name in submitted}),
+                    meta={'csrf': False})
+  form.validate()
+  changes = {name: form[name].data for name in submitted if blank(form[name].data) != blank(current[name])}
+  errors = {name: form.errors[name] for name in changes if name in form.errors}
+  return changes, errors
+
+def update_listing(kind, listing, values):
+  # shared by the edit forms and PATCH; nothing is written when there are
+  # errors or no changes
+  changes, errors = diff_listing(kind, listing, values)
+  if errors or not changes:
+    return changes, errors
+  for name, value in changes.items():
+    setattr(listing, name, value)
+  if 'image_link' in changes:
+    queue_thumbnails(changes['image_link'])
+  if kind == 'venue' and changes.keys() & {'address', 'city', 'state'}:
+    queue_geocode(listing)
+  listing_id = listing.id
+  features = listing_features(kind, listing)
+  db.session.commit()
+  if 'name' in changes:
+    name_indexes[kind].add(listing_id, changes['name'])
+    listing_renamed(kind, listing_id, changes['name'])
+  if changes.keys() & {'name', 'city', 'state', 'address'}:
+    duplicate_indexes[kind].add(listing_id, features)
+  return changes, errors
+
+def json_formdata(form, values):
+  # a JSON object as the form would have posted it, so its values are
+  # coerced and validated the same way; ValueError for values no form could
+  # have sent
+  formdata = MultiDict()
+  for name, value in values.items():
+    if name not in form:
+      continue
+    field = form[name]
+    if isinstance(field, BooleanField):
+      if not isinstance(value, bool):
+        raise ValueError('%s must be true or false' % name)
+      formdata.add(name, 'y' if value else 'false')
+    elif isinstance(field, SelectMultipleField):
+      if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError('%s must be a list of strings' % name)
+      formdata.setlist(name, value)
+    else:
+      if value is not None and not isinstance(value, str):
+        raise ValueError('%s must be a string' % name)
+      formdata.add(name, value or '')
+  return formdata
+
+def patch_listing(kind, listing_id):
+  # JSON object, or form fields, with only the fields to change
+  model = Venue if kind == 'venue' else Artist
+  listing = model.query.get_or_404(listing_id)
+  form_class = VenueForm if kind == 'venue' else ArtistForm
+  values = request.get_json(silent=True)
+  if values is None:
+    names, formdata = list(request.form), request.form
+  elif not isinstance(values, dict):
+    return json_response({'error': 'expected an object of fields'}, 400)
+  else:
+    try:
+      names, formdata = list(values), json_formdata(form_class(formdata=None, meta={'csrf': False}), values)
+    except ValueError as e:
+      return json_response({'error': str(e)}, 400)
+  data = form_class(formdata=formdata, meta={'csrf': False}).data
+  values = {name: data[name] for name in names if name in data}
+  try:
+    changes, errors = update_listing(kind, listing, values)
+  except:
+    db.session.rollback()
+    print(sys.exc_info())
+    return json_response({'error': '%s could not be updated' % kind}, 500)
+  finally:
+    db.session.close()
+  if errors:
+    return json_response({'errors': errors}, 400)
+  return json_response({'id': listing_id, 'changed': sorted(changes)})
+
+def flash_update(kind, name, changes, errors):
+  for field, messages in errors.items():
+    flash('%s: %s' % (field, ', '.join(messages)))
+  if errors:
+    flash('%s could not be updated.' % kind.capitalize())
+  elif changes:
+    flash('%s %s was successfully updated' % (kind.capitalize(), name))
+  else:
+    flash('Nothing to update.')
+
+#----------------------------------------------------------------------------#
+# Facets.
+#----------------------------------------------------------------------------#
+
+def filter_facets(query, model):
+  # genre containment is answered by the GIN index on genres, city and state
+  # by the (state, city) index
+  genres = [genre for genre in request.values.getlist('genre') if genre in GENRE_BITS]
+  if genres:
+    query = query.filter(model.genres.op('@>')(db.cast(genres, postgresql.ARRAY(db.String))))
+  for name in ('state', 'city'):
+    value = request.values.get(name)
+    if value:
+      query = query.filter(getattr(model, name) == value)
+  return query
+
+def facet_counts(query, model):
+  # a single aggregate over the filtered rows: city and state counts come from
+  # the grouping, genre counts from one bit test per genre on genre_mask
+  by_genre = [db.func.count().filter(model.genre_mask.op('&')(bit) != 0) for bit in GENRE_BITS.values()]
+  rows = query.order_by(None).with_entities(model.state, model.city, db.func.count(), *by_genre) \
+              .group_by(model.state, model.city).all()
+  genres = [0] * len(GENRE_BITS)
+  states = {}
+  cities = {}
+  for state, city, count, *counts in rows:
+    states[state] = states.get(state, 0) + count
+    cities[city] = cities.get(city, 0) + count
+    genres = [total + count for total, count in zip(genres, counts)]
+  return {
+    "genres": [(genre, count) for genre, count in zip(GENRE_BITS, genres) if count],
+    "states": sorted(states.items()),
+    "cities": sorted(cities.items(), key=lambda city: (-city[1], city[0]))[:app.config['FACET_CITY_LIMIT']],
+  }
+
+def facet_url(name, value):
+  # link to the current page with one facet value toggled, keeping the other
+  # filters and the search term
+  args = request.values.to_dict(flat=False)
+  values = args.get(name, [])
+  if value in values:
+    values = [v for v in values if v != value]
+  elif name == 'genre':
+    values = values + [value]
+  else:
+    values = [value]
+  args[name] = values
+  return url_for(request.endpoint, **args)
+
+app.jinja_env.globals['facet_url'] = facet_url
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+job_handlers = {}
+
+def job_handler(kind):
+  def decorator(f):
+    job_handlers[kind] = f
+    return f
+  return decorator
+
+def enqueue(kind, **payload):
+  # outbox: the job is added to the current session, so it is committed (or
+  # rolled back) together with the model change that caused it
+  db.session.add(Job(kind=kind, payload=payload))
+
+def run_next_job():
+  # the claimed row stays locked until commit, so other workers skip it and
+  # a crashed worker simply releases it for a retry
+  job = Job.query.filter(Job.status == 'pending', Job.run_at <= datetime.utcnow()) \
+                 .order_by(Job.run_at).with_for_update(skip_locked=True).first()
+  if job is None:
+    db.session.rollback()
+    return False
+
+  # handlers run inside the worker's transaction and must not commit
+  savepoint = db.session.begin_nested()
+  try:
+    handler = job_handlers[job.kind]
+    handler(**job.payload)
+    savepoint.commit()
+    db.session.delete(job)
+  except Exception:
+    savepoint.rollback()
+    job.attempts += 1
+    job.last_error = traceback.format_exc()
+    if job.attempts >= app.config['JOB_MAX_ATTEMPTS']:
+      job.status = 'failed'
+      app.logger.error('job %s failed permanently: %s', job, job.last_error)
+    else:
+      delay = min(app.config['JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1), app.config['JOB_MAX_RETRY_DELAY'])
+      job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+  db.session.commit()
+  return True
+
+#----------------------------------------------------------------------------#
+# Caches.
+#----------------------------------------------------------------------------#
+
+# In-process caches register here to hear about changes to venues, artists
+# and shows made by any worker: triggers on those tables NOTIFY
+# {"table", "op", "id", ...} and every worker's listener
+# thread dispatches the payload to the handlers for that table. Flush
+# handlers rebuild everything when notifications may have been missed.
+change_handlers = {}
+flush_handlers = []
+
+def on_change(table):
+  def decorator(f):
+    change_handlers.setdefault(table, []).append(f)
+    return f
+  return decorator
+
+def on_flush(f):
+  flush_handlers.append(f)
+  return f
+
+def dispatch_change(change):
+  with app.app_context():
+    try:
+      if change['table'] in ('venues', 'artists') and change['op'] != 'DELETE' and 'name' not in change:
+        # left out of the payload when too long to fit in a notification
+        model = Venue if change['table'] == 'venues' else Artist
+        change['name'] = db.session.query(model.name).filter_by(id=change['id']).scalar()
+        if change['name'] is None:
+          # deleted since, its DELETE notification follows
+          return
+      for handler in change_handlers.get(change['table'], ()):
+        handler(change)
+    finally:
+      db.session.remove()
+
+def flush_caches():
+  with app.app_context():
+    try:
+      for handler in flush_handlers:
+        handler()
+    finally:
+      db.session.remove()
+
+change_listener = None
+
+@app.before_first_request
+def start_change_listener():
+  global change_listener
+  if app.config['CHANGE_LISTENER_ENABLED'] and change_listener is None:
+    change_listener = ChangeListener(app.config['SQLALCHEMY_DATABASE_URI'],
+                                     on_change=dispatch_change, on_gap=flush_caches)
+    change_listener.start()
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# artist and venue names by id, kept in memory so the show form can look
+# them up on every keystroke without touching the database
+name_indexes = {
+  'artist': PrefixIndex(),
+  'venue': PrefixIndex(),
+}
+
+@app.before_first_request
+@on_flush
+def build_name_indexes():
+  name_indexes['artist'].build(db.session.query(Artist.id, Artist.name))
+  name_indexes['venue'].build(db.session.query(Venue.id, Venue.name))
+
+@on_change('artists')
+@on_change('venues')
+def update_name_index(change):
+  index = name_indexes['venue' if change['table'] == 'venues' else 'artist']
+  if not touched(change, 'name'):
+    return
+  if change['op'] == 'DELETE':
+    index.remove(change['id'])
+  else:
+    index.add(change['id'], change['name'])
+
+#----------------------------------------------------------------------------#
+# Duplicates.
+#----------------------------------------------------------------------------#
+
+# MinHash signatures of every venue and artist listing, so a new listing can
+# be checked for near-duplicates without scanning the table
+
+duplicate_indexes = {
+  'artist': DuplicateIndex(threshold=app.config['DUPLICATE_THRESHOLD']),
+  'venue': DuplicateIndex(threshold=app.config['DUPLICATE_THRESHOLD']),
+}
+
+def listing_features(kind, row):
+  if kind == 'venue':
+    return shingles(row.name, row.city, row.state, row.address)
+  return shingles(row.name, row.city, row.state)
+
+def listing_rows(kind):
+  if kind == 'venue':
+    return db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address)
+  return db.session.query(Artist.id, Artist.name, Artist.city, Artist.state)
+
+def build_duplicate_index(kind, index=None):
+  index = index or duplicate_indexes[kind]
+  index.build((row.id, listing_features(kind, row)) for row in listing_rows(kind))
+  return index
+
+@app.before_first_request
+@on_flush
+def build_duplicate_indexes():
+  for kind in duplicate_indexes:
+    build_duplicate_index(kind)
+
+@on_change('artists')
+@on_change('venues')
+def update_duplicate_index(change):
+  kind = 'venue' if change['table'] == 'venues' else 'artist'
+  if not touched(change, 'name', 'city', 'state', 'address'):
+    return
+  if change['op'] == 'DELETE':
+    duplicate_indexes[kind].remove(change['id'])
+    return
+  model = Venue if kind == 'venue' else Artist
+  row = listing_rows(kind).filter(model.id == change['id']).first()
+  if row is not None:
+    duplicate_indexes[kind].add(row.id, listing_features(kind, row))
+
+def flash_duplicates(kind, matches):
+  # the new listing is kept, but whoever created it hears about the likely
+  # duplicates straight away
+  names = [name_indexes[kind].names.get(id) for id, _ in matches[:5]]
+  names = [name for name in names if name]
+  if names:
+    flash('This %s looks like a duplicate of: %s' % (kind, ', '.join(names)))
+
+def merge_listings(kind, keep, duplicates):
+  # repoint every show and show series of the duplicates to the kept listing
+  # and delete the duplicates, in the caller's transaction
+  column = Shows.venue_id if kind == 'venue' else Shows.artist_id
+  series_column = ShowSeries.venue_id if kind == 'venue' else ShowSeries.artist_id
+  model = Venue if kind == 'venue' else Artist
+  moved = Shows.query.filter(column.in_(duplicates)) \
+                     .update({column: keep}, synchronize_session=False)
+  ShowSeries.query.filter(series_column.in_(duplicates)) \
+                  .update({series_column: keep}, synchronize_session=False)
+  model.query.filter(model.id.in_(duplicates)).delete(synchronize_session=False)
+  return moved
+
+#----------------------------------------------------------------------------#
+# Home page.
+#----------------------------------------------------------------------------#
+
+# The home page lists the newest venues and artists and the venues with the
+# most upcoming shows from these lists, so rendering it runs no query. New
+# and renamed listings are applied as they arrive; upcoming show counts,
+# deletions and shows turning into past shows are caught up by a refresh
+# shortly after a change and every HOME_REFRESH_INTERVAL seconds.
+
+home_sections = {
+  'recent_venues': TopN(app.config['HOME_SECTION_SIZE'], key=lambda row: row.id),
+  'recent_artists': TopN(app.config['HOME_SECTION_SIZE'], key=lambda row: row.id),
+  'trending_venues': TopN(app.config['HOME_SECTION_SIZE'], key=lambda row: (row.num_upcoming_shows, -row.id)),
+}
+home_refresher = None
+
+@app.before_first_request
+@on_flush
+def build_home_sections():
+  size = app.config['HOME_SECTION_SIZE']
+  home_sections['recent_venues'].replace(
+    map(NameRow._make, db.session.query(Venue.id, Venue.name).order_by(Venue.id.desc()).limit(size)))
+  home_sections['recent_artists'].replace(
+    map(NameRow._make, db.session.query(Artist.id, Artist.name).order_by(Artist.id.desc()).limit(size)))
+  upcoming = upcoming_show_counts(Shows.venue_id)
+  home_sections['trending_venues'].replace(
+    map(Listing._make, db.session.query(Venue.id, Venue.name, upcoming.c.num_upcoming_shows)
+                                 .join(upcoming, upcoming.c.id == Venue.id)
+                                 .order_by(upcoming.c.num_upcoming_shows.desc(), Venue.id).limit(size)))
+
+def refresh_home_sections():
+  with app.app_context():
+    try:
+      build_home_sections()
+    finally:
+      db.session.remove()
+
+@app.before_first_request
+def start_home_refresher():
+  global home_refresher
+  if home_refresher is None:
+    home_refresher = Refresher(refresh_home_sections, interval=app.config['HOME_REFRESH_INTERVAL'],
+                               delay=app.config['HOME_REFRESH_DELAY'])
+    home_refresher.start()
+
+def home_sections_stale():
+  if home_refresher is not None:
+    home_refresher.mark_stale()
+
+def listing_created(kind, id, name):
+  home_sections['recent_%ss' % kind].offer(NameRow(id, name))
+
+def listing_renamed(kind, id, name):
+  home_sections['recent_%ss' % kind].update(id, name=name)
+  if kind == 'venue':
+    home_sections['trending_venues'].update(id, name=name)
+
+def listing_deleted(kind, id):
+  removed = [home_sections[name].discard(id) for name in ('recent_%ss' % kind, 'trending_venues')
+             if kind == 'venue' or name != 'trending_venues']
+  if any(removed):
+    home_sections_stale()
+
+@on_change('artists')
+@on_change('venues')
+def update_home_sections(change):
+  kind = 'venue' if change['table'] == 'venues' else 'artist'
+  if change['op'] == 'INSERT':
+    listing_created(kind, change['id'], change['name'])
+  elif change['op'] == 'UPDATE':
+    if touched(change, 'name'):
+      listing_renamed(kind, change['id'], change['name'])
+  else:
+    listing_deleted(kind, change['id'])
+
+@on_change('shows')
+def update_trending_venues(change):
+  home_sections_stale()
+
+def render_home():
+  return render_template('pages/home.html', **{name: section.rows for name, section in home_sections.items()})
+
+#----------------------------------------------------------------------------#
+# Live show updates.
+#----------------------------------------------------------------------------#
+
+# one notification from the change listener is fanned out to every open
+# /shows/stream connection in this worker
+show_events = EventHub(max_queue=app.config['SSE_QUEUE_SIZE'],
+                       max_subscribers=app.config['SSE_MAX_SUBSCRIBERS'],
+                       encode=lambda data: dumps(data).decode('utf-8'))
+
+@on_change('shows')
+def publish_show_change(change):
+  if not len(show_events):
+    return
+  if change['op'] == 'DELETE':
+    show_events.publish('show_removed', {"id": change['id']})
+    return
+  row = show_rows().filter(Shows.id == change['id']).first()
+  if row is None:
+    return
+  show = ShowRow._make(row)
+  show_events.publish('show_created' if change['op'] == 'INSERT' else 'show_updated',
+                      dict(show._asdict(), start_time_display=format_datetime(show.start_time, 'full')))
+
+#----------------------------------------------------------------------------#
+# Calendar feeds.
+#----------------------------------------------------------------------------#
+
+# Feeds are stored in calendar_feeds and only rebuilt after triggers on shows,
+# venues and artists delete the rows they affect. ETags are also remembered
+# here so a client polling an unchanged feed gets a 304 without a query.
+feed_etags = {}
+
+def build_calendar_feed(entity, entity_id):
+  model, column = (Venue, Shows.venue_id) if entity == 'venue' else (Artist, Shows.artist_id)
+  owner = model.query.get(entity_id)
+  if owner is None:
+    return None
+  rows = db.session.query(Shows.id, Shows.start_time, Venue.name, Venue.address, Venue.city, Venue.state, Artist.name) \
+                   .join(Venue, Shows.venue_id == Venue.id) \
+                   .join(Artist, Shows.artist_id == Artist.id) \
+                   .filter(column == entity_id).order_by(Shows.start_time)
+  events = [{
+    "uid": 'show-%d@fyyur' % id,
+    "start": start_time,
+    "summary": '%s at %s' % (artist_name, venue_name),
+    "location": ', '.join(part for part in (venue_name, address, city, state) if part),
+    "url": url_for('show_%s' % entity, _external=True, **{entity + '_id': entity_id})
+  } for id, start_time, venue_name, address, city, state, artist_name in rows]
+  body = calendar(owner.name, events)
+  return CalendarFeed(entity=entity, entity_id=entity_id, body=body,
+                      etag=hashlib.sha1(body.encode('utf-8')).hexdigest(), updated_at=datetime.utcnow())
+
+def store_calendar_feed(entity, entity_id):
+  # builds and stores the feed under a share lock on its version row. The
+  # triggers bump that row before deleting a feed, so a change to the shows
+  # either committed before the lock and is in the feed, or waits for the
+  # feed to be stored and then deletes it
+  db.session.execute(postgresql.insert(CalendarFeedVersion.__table__)
+                               .values(entity=entity, entity_id=entity_id, version=0)
+                               .on_conflict_do_nothing())
+  db.session.commit()
+  db.session.query(CalendarFeedVersion.version).filter_by(entity=entity, entity_id=entity_id) \
+                                              .with_for_update(read=True).scalar()
+  feed = build_calendar_feed(entity, entity_id)
+  if feed is None:
+    db.session.rollback()
+    return None
+  try:
+    db.session.merge(feed)
+    db.session.commit()
+  except IntegrityError:
+    # another worker stored it first, ours is just as good to serve
+    db.session.rollback()
+  return feed
+
+def calendar_response(entity, entity_id):
+  key = (entity, entity_id)
+  cached = feed_etags.get(key)
+  if cached is not None and cached[1] > time.monotonic() and cached[0] in request.if_none_match:
+    return not_modified(cached[0])
+
+  etag = db.session.query(CalendarFeed.etag).filter_by(entity=entity, entity_id=entity_id).scalar()
+  if etag is not None and etag in request.if_none_match:
+    feed_etags[key] = (etag, time.monotonic() + app.config['FEED_ETAG_TTL'])
+    return not_modified(etag)
+
+  feed = CalendarFeed.query.get(key) if etag is not None else None
+  if feed is None:
+    feed = store_calendar_feed(entity, entity_id)
+    if feed is None:
+      abort(404)
+  feed_etags[key] = (feed.etag, time.monotonic() + app.config['FEED_ETAG_TTL'])
+
+  response = Response(feed.body, mimetype='text/calendar')
+  response.set_etag(feed.etag)
+  response.headers['Content-Disposition'] = 'inline; filename="%s-%d.ics"' % key
+  return response
+
+def not_modified(etag):
+  response = Response(status=304)
+  response.set_etag(etag)
+  return response
+
+@on_change('shows')
+def forget_show_feed_etags(change):
+  feed_etags.pop(('venue', change['venue_id']), None)
+  feed_etags.pop(('artist', change['artist_id']), None)
+
+@on_change('venues')
+@on_change('artists')
+@on_flush
+def forget_feed_etags(change=None):
+  # venue names appear in artist feeds and the other way round
+  if change is None or touched(change, 'name', 'address', 'city', 'state'):
+    feed_etags.clear()
+
+#----------------------------------------------------------------------------#
+# Stats.
+#----------------------------------------------------------------------------#
+
+# Booking stats are read from show_rollups only, so a query costs the number
+# of rollup rows in the selected range, not the size of shows.
+
+STATS_GROUPS = ('venue', 'artist', 'genre', 'state', 'city', 'period')
+
+def rollup_stats(by='venue', period='month', genre=None, state=None, city=None,
+                 start=None, end=None, limit=None):
+  query = db.session.query(ShowRollup).filter(ShowRollup.period == period)
+  if genre:
+    query = query.filter(ShowRollup.genre == genre)
+  elif by == 'genre':
+    query = query.filter(ShowRollup.genre != ALL_GENRES)
+  else:
+    query = query.filter(ShowRollup.genre == ALL_GENRES)
+  if state:
+    query = query.filter(ShowRollup.state == state)
+  if city:
+    query = query.filter(ShowRollup.city == city)
+  if start:
+    query = query.filter(ShowRollup.period_start >= start)
+  if end:
+    query = query.filter(ShowRollup.period_start < end)
+
+  count = db.func.sum(ShowRollup.show_count).label('show_count')
+  if by == 'venue':
+    query = query.join(Venue, Venue.id == ShowRollup.venue_id) \
+                 .with_entities(ShowRollup.venue_id, Venue.name, count).group_by(ShowRollup.venue_id, Venue.name)
+  elif by == 'artist':
+    query = query.join(Artist, Artist.id == ShowRollup.artist_id) \
+                 .with_entities(ShowRollup.artist_id, Artist.name, count).group_by(ShowRollup.artist_id, Artist.name)
+  elif by == 'city':
+    query = query.with_entities(ShowRollup.state, ShowRollup.city, count).group_by(ShowRollup.state, ShowRollup.city)
+  else:
+    column = {'genre': ShowRollup.genre, 'state': ShowRollup.state, 'period': ShowRollup.period_start}[by]
+    query = query.with_entities(column, count).group_by(column)
+
+  if by == 'period':
+    query = query.order_by(ShowRollup.period_start)
+  else:
+    query = query.order_by(count.desc()).limit(limit or app.config['STATS_MAX_ROWS'])
+  if by == 'city':
+    return [StatRow(city, '%s, %s' % (city, state), show_count) for state, city, show_count in query]
+  if by in ('venue', 'artist'):
+    return [StatRow._make(row) for row in query]
+  return [StatRow(value, value, show_count) for value, show_count in query]
+
+def stats_args():
+  # the filters shared by /stats and /stats.json, from the query string
+  def date_arg(name):
+    try:
+      return datetime.strptime(request.args[name], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+      return None
+
+  by = request.args.get('by', 'venue')
+  period = request.args.get('period', 'month')
+  genre = request.args.get('genre')
+  return {
+    'by': by if by in STATS_GROUPS else 'venue',
+    'period': period if period in ('day', 'month') else 'month',
+    'genre': genre if genre in GENRE_BITS else None,
+    'state': request.args.get('state') or None,
+    'city': request.args.get('city') or None,
+    'start': date_arg('from'),
+    'end': date_arg('to'),
+    'limit': max(1, min(request.args.get('limit', app.config['STATS_MAX_ROWS'], type=int),
+                        app.config['STATS_MAX_ROWS'])),
+  }
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+gazetteer = {}
+
+def geocode(venue):
+  # city-level coordinates from the local gazetteer file, no network calls
+  if not app.config['GAZETTEER_PATH']:
+    return False
+  if not gazetteer:
+    gazetteer.update(load_gazetteer(app.config['GAZETTEER_PATH']))
+  place = gazetteer.get((venue.city.strip().lower(), venue.state.strip().upper()))
+  if place is None:
+    venue.latitude = venue.longitude = venue.geohash = None
+    return False
+  venue.latitude, venue.longitude = place
+  venue.geohash = geohash_encode(*place, precision=app.config['GEOHASH_PRECISION'])
+  return True
+
+@job_handler('geocode_venue')
+def geocode_venue(venue_id):
+  venue = Venue.query.get(venue_id)
+  if venue is not None:
+    geocode(venue)
+
+def queue_geocode(venue):
+  if app.config['GAZETTEER_PATH']:
+    enqueue('geocode_venue', venue_id=venue.id)
+
+#----------------------------------------------------------------------------#
+# Thumbnails.
+#----------------------------------------------------------------------------#
+
+thumbnails = ThumbnailStore(app.config['THUMBNAIL_DIR'],
+                            widths=app.config['THUMBNAIL_WIDTHS'],
+                            source_dir=app.config['THUMBNAIL_SOURCE_DIR'])
+
+@job_handler('thumbnails')
+def generate_thumbnails(url):
+  thumbnails.generate(url)
+
+def queue_thumbnails(url):
+  # resized by a worker, pages fall back to the original image_link until
+  # the variants exist
+  if url and thumbnails.available and thumbnails.lookup(url) is None:
+    enqueue('thumbnails', url=url)
+
+def thumbnail_srcset(url, ext='webp'):
+  return thumbnails.srcset(url, ext, '/thumbs')
+
+app.jinja_env.globals['thumbnail_srcset'] = thumbnail_srcset
+
+#----------------------------------------------------------------------------#
+# Rate limiting.
+#----------------------------------------------------------------------------#
+
+# Before any work is done, a request is refused with 503 while this worker
+# is overloaded (too many requests in flight, or database connections
+# taking too long to check out), and with 429 when its client has spent the
+# budget RATE_LIMITS gives its endpoint.
+
+rate_limiter = PostgresBackend(db.engine) if app.config['RATE_LIMIT_BACKEND'] == 'postgres' else MemoryBackend()
+in_flight = InFlight()
+
+def client_id():
+  # each proxy appends the address it got the request from, so only the
+  # last RATE_LIMIT_PROXIES entries can be trusted
+  proxies = app.config['RATE_LIMIT_PROXIES']
+  forwarded = [address.strip() for address in request.headers.get('X-Forwarded-For', '').split(',')]
+  if proxies and len(forwarded) >= proxies and forwarded[-proxies]:
+    return forwarded[-proxies]
+  return request.remote_addr or 'unknown'
+
+def refuse(status, retry_after):
+  response = Response(render_template('errors/%d.html' % status), status=status)
+  response.headers['Retry-After'] = str(max(1, int(math.ceil(retry_after))))
+  return response
+
+@app.before_request
+def limit_requests():
+  if request.endpoint in app.config['LOAD_SHED_EXEMPT'] or request.environ.get('fyyur.warm_up'):
+    return
+  g.in_flight = True
+  if in_flight.enter() > app.config['MAX_IN_FLIGHT']:
+    return refuse(503, 1)
+  pool_wait = getattr(db.engine.pool, 'current_wait', None)
+  if pool_wait is not None and pool_wait() > app.config['DB_POOL_MAX_WAIT']:
+    return refuse(503, pool_wait())
+
+  budget = app.config['RATE_LIMITS'].get(request.endpoint)
+  if budget is None:
+    return
+  limit, seconds = budget
+  try:
+    allowed, retry_after = rate_limiter.take('%s:%s' % (request.endpoint, client_id()),
+                                             float(limit) / seconds, limit)
+  except Exception:
+    # a broken shared backend lets requests through rather than failing them
+    app.logger.exception('rate limiter failed')
+    return
+  if not allowed:
+    return refuse(429, retry_after)
+
+@app.teardown_request
+def leave_in_flight(exc):
+  if g.pop('in_flight', False):
+    in_flight.leave()
+
+#----------------------------------------------------------------------------#
+# Profiling.
+#----------------------------------------------------------------------------#
+
+# A request is profiled when it carries the X-Profile-Token header or a
+# ?profile= value signed for its path (see `flask profile-link`). Profiles
+# are written when the response is closed, so streamed pages are included.
+# Signed links need PROFILE_SECRET; without it only the header works.
+
+profile_signer = URLSafeTimedSerializer(app.config['PROFILE_SECRET'], salt='profile') \
+                 if app.config['PROFILE_SECRET'] else None
+
+def profile_authorized():
+  token = app.config['PROFILE_TOKEN']
+  if token and hmac.compare_digest(request.headers.get('X-Profile-Token', ''), token):
+    return True
+  if profile_signer is None:
+    return False
+  try:
+    return profile_signer.loads(request.args.get('profile', ''),
+                                max_age=app.config['PROFILE_LINK_MAX_AGE']) == request.path
+  except BadSignature:
+    return False
+
+def profile_link(path):
+  # the bare path when links can't be signed, for clients sending the header
+  if profile_signer is None:
+    return path
+  return '%s?profile=%s' % (path, profile_signer.dumps(path))
+
+@app.before_request
+def start_profiler():
+  if request.endpoint in ('profiles', 'profile_file') or not profile_authorized():
+    return
+  g.profiler = Sampler(threading.get_ident(), app.config['PROFILE_INTERVAL'])
+  g.profiler.start()
+
+@app.after_request
+def stop_profiler(response):
+  sampler = g.pop('profiler', None)
+  if sampler is None:
+    return response
+  name = '%s-%s-%s' % (datetime.utcnow().strftime('%Y%m%dT%H%M%S'), request.endpoint, os.urandom(3).hex())
+
+  def finish():
+    sampler.stop()
+    write_profile(app.config['PROFILE_DIR'], name, sampler, app.config['PROFILE_KEEP'])
+
+  response.call_on_close(finish)
+  response.headers['X-Profile'] = name
+  return response
+
+#----------------------------------------------------------------------------#
+# Warm-up.
+#----------------------------------------------------------------------------#
+
+# A new worker opens its database connections, compiles every template,
+# fills its caches and renders the most requested pages before
+# /healthz/ready answers 200. The pages come from the access list every
+# worker keeps adding its own traffic to. Each worker starts its warm-up
+# after it forks (see gunicorn.conf.py) or on its first readiness check;
+# importing the app doesn't, so a preloading master never runs the hooks.
+
+access_list = AccessList(app.config['ACCESS_LIST_PATH'], app.config['ACCESS_LIST_SIZE'])
+access_list_flusher = None
+
+@app.after_request
+def record_access(response):
+  if request.method == 'GET' and response.status_code == 200 and response.mimetype == 'text/html' \
+     and not request.args and request.endpoint != 'profiles' and not request.environ.get('fyyur.warm_up'):
+    access_list.record(request.path)
+  return response
+
+@app.before_first_request
+def start_access_list_flusher():
+  global access_list_flusher
+  if access_list_flusher is None:
+    access_list_flusher = Refresher(access_list.flush, interval=app.config['ACCESS_LIST_INTERVAL'])
+    access_list_flusher.start()
+
+def open_pool_connections():
+  # checked out together so the pool has to open that many, then returned
+  # to it open
+  connections = []
+  try:
+    for _ in range(min(app.config['WARM_UP_CONNECTIONS'], db.engine.pool.size())):
+      connection = db.engine.connect()
+      connections.append(connection)
+      connection.execute('SELECT 1')
+  finally:
+    for connection in connections:
+      connection.close()
+
+def compile_templates():
+  for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+    app.jinja_env.get_template(name)
+
+def fill_caches():
+  # what would otherwise run on the first real request
+  with app.test_request_context():
+    app.try_trigger_before_first_request_functions()
+
+def render_top_pages():
+  # the list pages stand in until the access list has been written
+  paths = access_list.top(app.config['WARM_UP_PAGES']) or ['/', '/venues', '/artists', '/shows']
+  client = app.test_client()
+  failed = []
+  for path in paths:
+    response = client.get(path, environ_overrides={'fyyur.warm_up': True})
+    response.get_data()
+    response.close()
+    if not 200 <= response.status_code < 300:
+      failed.append('%s %d' % (path, response.status_code))
+  if failed:
+    raise RuntimeError('%d of %d pages failed: %s' % (len(failed), len(paths), ', '.join(failed)))
+
+warmup = Warmup([
+  ('connections', open_pool_connections),
+  ('templates', compile_templates),
+  ('caches', fill_caches),
+  ('pages', render_top_pages),
+], required=['connections'])
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 @app.route('/')
 def index():
-  return render_template('pages/home.html')
+  return render_home()
+
 
+@app.route('/thumbs/<key>/<filename>')
+def thumbnail(key, filename):
+  # variants are keyed by content hash, so they never change once written
+  variant = THUMBNAIL_VARIANT.fullmatch(filename)
+  if not THUMBNAIL_KEY.fullmatch(key) or not variant:
+    abort(404)
+  mimetypes = {ext: mimetype for ext, _, mimetype in FORMATS}
+  return send_from_directory(os.path.join(thumbnails.root, key), filename,
+                             mimetype=mimetypes[variant.group(1)], cache_timeout=365 * 24 * 3600)
 
 
 #  Create Venue
@@ -139,8 +1308,17 @@ def create_venue_submission():
     seeking_talent       = form.seeking_talent.data
     seeking_description  = request.form['seeking_description']
     venue = Venue(name=name, city=city, state=state, address=address, phone=phone, genres=genres, facebook_link=facebook_link, image_link=image_link, website=website, seeking_talent=seeking_talent, seeking_description=seeking_description)
+    features = listing_features('venue', venue)
+    duplicates = duplicate_indexes['venue'].query(features)
     db.session.add(venue)
+    db.session.flush()
+    queue_thumbnails(image_link)
+    queue_geocode(venue)
+    venue_id = venue.id
     db.session.commit()
+    name_indexes['venue'].add(venue_id, name)
+    duplicate_indexes['venue'].add(venue_id, features)
+    listing_created('venue', venue_id, name)
   except:
     error = True
     db.session.rollback()
@@ -153,7 +1331,8 @@ def create_venue_submission():
   else:
     # on successful db insert, flash success
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
-  return render_template('pages/home.html')
+    flash_duplicates('venue', duplicates)
+  return render_home()
 
 
 
@@ -184,25 +1363,12 @@ def edit_venue(venue_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   # take values from the form submitted, and update existing
-  # venue record with ID <venue_id> using the new attributes
+  # venue record with ID <venue_id> using the attributes that changed
   error = False
-  form = VenueForm() 
-  venue = Venue.query.get(venue_id)
-
+  venue = Venue.query.get_or_404(venue_id)
+  form = VenueForm(meta={'csrf': False})
   try:
-    venue.name    = request.form['name']
-    venue.city    = request.form['city']
-    venue.state   = request.form['state']
-    venue.address = request.form['address']
-    venue.phone   = request.form['phone']
-    venue.genres  = request.form.getlist('genres')
-    venue.facebook_link = request.form['facebook_link']
-    venue.image_link    = request.form['image_link']
-    venue.website       = request.form['website'] 
-    venue.seeking_talent       = form.seeking_talent.data
-    venue.seeking_description  = request.form['seeking_description']
-   
-    db.session.commit()
+    changes, errors = update_listing('venue', venue, form.data)
   except:
     error = True
     db.session.rollback()
@@ -212,11 +1378,16 @@ def edit_venue_submission(venue_id):
   if error:
     # on unsuccessful db insert, flash an error instead.
     flash('An error occurred. Venue could not be updated.')
-  else:
-    # on successful db insert, flash success
-    flash('Venue ' + request.form['name'] + ' was successfully updated')
+    return redirect(url_for('show_venue', venue_id=venue_id))
+  flash_update('venue', request.form['name'], changes, errors)
+  if errors:
+    return redirect(url_for('edit_venue', venue_id=venue_id))
   return redirect(url_for('show_venue', venue_id=venue_id))
 
+@app.route('/venues/<int:venue_id>', methods=['PATCH'])
+def patch_venue(venue_id):
+  return patch_listing('venue', venue_id)
+
 
 #  Delete Venue
 #  ----------------------------------------------------------------
@@ -233,6 +1404,8 @@ def delete_venue(venue_id):
   try:
     db.session.delete(venue)
     db.session.commit()
+    name_indexes['venue'].remove(int(venue_id))
+    listing_deleted('venue', int(venue_id))
   except:
     error = True
     db.session.rollback()
@@ -243,7 +1416,7 @@ def delete_venue(venue_id):
     flash('Venue could not be deleted.')
   else: 
     flash('Venue was successfully deleted.')
-  return render_template('pages/home.html')
+  return render_home()
 
 
 #  Show Venues
@@ -251,46 +1424,41 @@ def delete_venue(venue_id):
 
 @app.route('/venues')
 def venues():
-  # replace with real venues data.
-  # num_shows should be aggregated based on number of upcoming shows per venue.
-  data =[]
-  areas = Venue.query.distinct(Venue.city, Venue.state).all()
-  for area in areas:
-    query_result = Venue.query.join(Shows).filter(Shows.start_time > datetime.now(), Shows.venue_id == area.id).all()
-    upcoming_shows = len(query_result)
+  # venues grouped by area, with the number of upcoming shows per venue
+  data = []
+  query = filter_facets(Venue.query, Venue)
+  upcoming = upcoming_show_counts(Shows.venue_id)
+  rows = query.outerjoin(upcoming, upcoming.c.id == Venue.id) \
+              .with_entities(Venue.id, Venue.name, Venue.city, Venue.state,
+                             db.func.coalesce(upcoming.c.num_upcoming_shows, 0).label('num_upcoming_shows')) \
+              .order_by(Venue.state, Venue.city, Venue.name).all()
+  for (state, city), venues in itertools.groupby(rows, key=lambda row: (row.state, row.city)):
     data.append({
-      "city": area.city,
-      "state": area.state,
-      "venues": [{
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": upcoming_shows}for venue in Venue.query.filter_by(city=area.city, state=area.state).all()]})
+      "city": city,
+      "state": state,
+      "venues": [Listing(venue.id, venue.name, venue.num_upcoming_shows) for venue in venues]})
 
-  return render_template('pages/venues.html', areas=data);
+  return stream_template('pages/venues.html', areas=data, facets=facet_counts(query, Venue))
 
-@app.route('/venues/search', methods=['POST'])
+@app.route('/venues/search', methods=['GET', 'POST'])
 def search_venues():
   # implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  data = []
-  search_term = request.form.get('search_term', '')
-  search_response = Venue.query.filter(Venue.name.ilike('%' + search_term + '%')).all()
-  
-  for venue in search_response:
-    query_result = Venue.query.join(Shows).filter(Shows.start_time > datetime.now(), Shows.venue_id == venue.id).all()
-    data.append({
-            "id": venue.id,
-            "name": venue.name,
-            "num_upcoming_shows": len(query_result)
-        })
-
-    response = {
-        "count": len(search_response),
-        "data": data
-    }
+  search_term = request.values.get('search_term', '')
+  query = filter_facets(Venue.query.filter(Venue.name.ilike('%' + search_term + '%')), Venue)
+  upcoming = upcoming_show_counts(Shows.venue_id)
+  search_response = query.outerjoin(upcoming, upcoming.c.id == Venue.id) \
+                         .with_entities(Venue.id, Venue.name, db.func.coalesce(upcoming.c.num_upcoming_shows, 0)) \
+                         .all()
+
+  response = {
+      "count": len(search_response),
+      "data": [Listing._make(row) for row in search_response]
+  }
 
-  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term,
+                         facets=facet_counts(query, Venue))
 
 
 
@@ -298,50 +1466,42 @@ def search_venues():
 @app.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  # replace with real venue data from the venues table, using venue_id
-  data = []
   past_shows = []
   upcoming_shows = []
 
-  venue = Venue.query.filter_by(id=venue_id).first()
-  shows = Shows.query.filter_by(venue_id = venue.id).all()
- 
-  for show in shows:
-    artist = Artist.query.filter_by(id=show.artist_id).first()
-    start_time = format_datetime(str(show.start_time))
-    artist_show = {
-    "artist_id": artist.id,
-    "artist_name": artist.name,
-    "artist_image_link": artist.image_link,
-    "start_time": start_time
-    }
-    if show.start_time >= datetime.now():
-      upcoming_shows.append(artist_show)
-    elif show.start_time < datetime.now():
-      past_shows.append(artist_show)
-  data = {
-    "id": venue.id,
-    "name": venue.name,
-    "genres": venue.genres,
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description": venue.seeking_description,
-    "image_link": venue.image_link,
-    "past_shows": past_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows": upcoming_shows,
-    "upcoming_shows_count": len(upcoming_shows)
-    }
+  venue = db.session.query(Venue.id, Venue.name, Venue.genres, Venue.address, Venue.city, Venue.state,
+                           Venue.phone, Venue.website, Venue.facebook_link, Venue.seeking_talent,
+                           Venue.seeking_description, Venue.image_link) \
+                    .filter(Venue.id == venue_id).first()
+  if venue is None:
+    abort(404)
+  shows = db.session.query(Artist.id, Artist.name, Artist.image_link, Shows.start_time) \
+                    .join(Artist, Shows.artist_id == Artist.id) \
+                    .filter(Shows.venue_id == venue_id).order_by(Shows.start_time)
+
+  now = datetime.now()
+  for show in map(ArtistShow._make, shows):
+    if show.start_time >= now:
+      upcoming_shows.append(show)
+    else:
+      past_shows.append(show)
+  data = dict(venue._asdict(),
+    past_shows=past_shows,
+    past_shows_count=len(past_shows),
+    upcoming_shows=upcoming_shows,
+    upcoming_shows_count=len(upcoming_shows)
+    )
 
   return render_template('pages/show_venue.html', venue=data)
 
 
 
+@app.route('/venues/<int:venue_id>/calendar.ics')
+def venue_calendar(venue_id):
+  return calendar_response('venue', venue_id)
+
+
+
 #  Create Artist
 #  ----------------------------------------------------------------
 
@@ -369,8 +1529,16 @@ def create_artist_submission():
     seeking_venue        = form.seeking_venue.data
     seeking_description  = request.form['seeking_description']
     artist = Artist(name=name, city=city, state=state, phone=phone, genres=genres, facebook_link=facebook_link, image_link=image_link, website=website, seeking_venue =seeking_venue , seeking_description=seeking_description)
+    features = listing_features('artist', artist)
+    duplicates = duplicate_indexes['artist'].query(features)
     db.session.add(artist)
+    db.session.flush()
+    queue_thumbnails(image_link)
+    artist_id = artist.id
     db.session.commit()
+    name_indexes['artist'].add(artist_id, name)
+    duplicate_indexes['artist'].add(artist_id, features)
+    listing_created('artist', artist_id, name)
   except:
     error = True
     db.session.rollback()
@@ -383,7 +1551,8 @@ def create_artist_submission():
   else:  
     # on successful db insert, flash success
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
-  return render_template('pages/home.html')
+    flash_duplicates('artist', duplicates)
+  return render_home()
 
       
 
@@ -412,24 +1581,12 @@ def edit_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   # take values from the form submitted, and update existing
-  # artist record with ID <artist_id> using the new attributes
+  # artist record with ID <artist_id> using the attributes that changed
   error = False
-  form = ArtistForm()  
-  artist = Artist.query.get(artist_id)
-
+  artist = Artist.query.get_or_404(artist_id)
+  form = ArtistForm(meta={'csrf': False})
   try:
-    artist.name    = request.form['name']
-    artist.city    = request.form['city']
-    artist.state   = request.form['state']
-    artist.phone   = request.form['phone']
-    artist.genres  = request.form.getlist('genres')
-    artist.facebook_link = request.form['facebook_link']
-    artist.image_link    = request.form['image_link']
-    artist.website       = request.form['website']
-    artist.seeking_venue        = form.seeking_venue.data
-    artist.seeking_description  = request.form['seeking_description']
-
-    db.session.commit()
+    changes, errors = update_listing('artist', artist, form.data)
   except:
     error = True
     db.session.rollback()
@@ -439,96 +1596,86 @@ def edit_artist_submission(artist_id):
   if error:
     # on unsuccessful db insert, flash an error instead.
     flash('An error occurred. Artist could not be updated.')
-  else:  
-    # on successful db insert, flash success
-    flash('Artist ' + request.form['name'] + ' was successfully updated')
+    return redirect(url_for('show_artist', artist_id=artist_id))
+  flash_update('artist', request.form['name'], changes, errors)
+  if errors:
+    return redirect(url_for('edit_artist', artist_id=artist_id))
   return redirect(url_for('show_artist', artist_id=artist_id))
 
+@app.route('/artists/<int:artist_id>', methods=['PATCH'])
+def patch_artist(artist_id):
+  return patch_listing('artist', artist_id)
+
 #  Show Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
   # replace with real data returned from querying the database
 
-  data = []
-  artists = Artist.query.all()
-  for artist in artists:
-    data.append({"id": artist.id,"name": artist.name})
+  query = filter_facets(Artist.query, Artist)
+  data = [NameRow._make(row) for row in query.with_entities(Artist.id, Artist.name)]
 
-  return render_template('pages/artists.html', artists=data)
+  return render_template('pages/artists.html', artists=data, facets=facet_counts(query, Artist))
 
 
-@app.route('/artists/search', methods=['POST'])
+@app.route('/artists/search', methods=['GET', 'POST'])
 def search_artists():
   # implement search on artists with partial string search. Ensure it is case-insensitive.
   # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
   # search for "band" should return "The Wild Sax Band".
-  data = []
-  search_term = request.form.get('search_term', '')
-  search_response = Artist.query.filter(Artist.name.ilike('%' + search_term  +'%')).all()
-  
-  for artist in search_response:
-    query_result = Artist.query.join(Shows).filter(Shows.start_time > datetime.now(), Shows.artist_id == artist.id).all()
-    data.append({
-      "id": artist.id,
-      "name": artist.name,
-      "num_upcoming_shows": len(query_result)
-      })
-    response = {
-      "count": len(search_response),
-      "data": data
-      }
-  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+  search_term = request.values.get('search_term', '')
+  query = filter_facets(Artist.query.filter(Artist.name.ilike('%' + search_term + '%')), Artist)
+  upcoming = upcoming_show_counts(Shows.artist_id)
+  search_response = query.outerjoin(upcoming, upcoming.c.id == Artist.id) \
+                         .with_entities(Artist.id, Artist.name, db.func.coalesce(upcoming.c.num_upcoming_shows, 0)) \
+                         .all()
+
+  response = {
+    "count": len(search_response),
+    "data": [Listing._make(row) for row in search_response]
+    }
+  return render_template('pages/search_artists.html', results=response, search_term=search_term,
+                         facets=facet_counts(query, Artist))
 
 
 
 @app.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-  # shows the venue page with the given venue_id
-  # replace with real venue data from the venues table, using venue_id
-  data = []   
+  # shows the artist page with the given artist_id
   past_shows = []
   upcoming_shows = []
 
-  shows =  Shows.query.filter_by(artist_id = artist_id).all()
-  artist = Artist.query.filter_by(id=artist_id).first()
- 
-  for show in shows:
-    venue = Venue.query.filter_by(id=show.venue_id).first()
-    start_time = format_datetime(str(show.start_time))
-
-    venue_show = {
-        "venue_id": venue.id,
-        "venue_name": venue.name,
-        "venue_image_link": venue.image_link,
-        "start_time": str(start_time)
-    }
-    if show.start_time >= datetime.now():
-        upcoming_shows.append(venue_show)
-    elif show.start_time < datetime.now():
-        past_shows.append(venue_show)
-
-  data = {
-          "id": artist.id,
-          "name": artist.name,
-          "genres": artist.genres,
-          "city": artist.city,
-          "state": artist.state,
-          "phone": artist.phone,
-          "facebook_link": artist.facebook_link,
-          "website": artist.website,
-          "image_link": artist.image_link,
-          "seeking_venue": artist.seeking_venue,
-          "seeking_description": artist.seeking_description,
-          "past_shows": past_shows,
-          "past_shows_count": len(past_shows),
-          "upcoming_shows":  upcoming_shows,
-          "upcoming_shows_count": len(upcoming_shows)
-       }
+  artist = db.session.query(Artist.id, Artist.name, Artist.genres, Artist.city, Artist.state, Artist.phone,
+                            Artist.facebook_link, Artist.website, Artist.image_link, Artist.seeking_venue,
+                            Artist.seeking_description) \
+                     .filter(Artist.id == artist_id).first()
+  if artist is None:
+    abort(404)
+  shows = db.session.query(Venue.id, Venue.name, Venue.image_link, Shows.start_time) \
+                    .join(Venue, Shows.venue_id == Venue.id) \
+                    .filter(Shows.artist_id == artist_id).order_by(Shows.start_time)
+
+  now = datetime.now()
+  for show in map(VenueShow._make, shows):
+    if show.start_time >= now:
+      upcoming_shows.append(show)
+    else:
+      past_shows.append(show)
+  data = dict(artist._asdict(),
+          past_shows=past_shows,
+          past_shows_count=len(past_shows),
+          upcoming_shows=upcoming_shows,
+          upcoming_shows_count=len(upcoming_shows)
+       )
 
   return render_template('pages/show_artist.html', artist=data)
 
 
+@app.route('/artists/<int:artist_id>/calendar.ics')
+def artist_calendar(artist_id):
+  return calendar_response('artist', artist_id)
+
+
 #  Create Shows
 #  ----------------------------------------------------------------
 @app.route('/shows/create')
@@ -547,10 +1694,23 @@ def create_show_submission():
     venue_id   = request.form['venue_id']  
     artist_id  = request.form['artist_id']
     start_time = request.form['start_time']
-
-    show = Shows(venue_id=venue_id, artist_id=artist_id, start_time=start_time)
-    db.session.add(show)
+    rule = series_rule(ShowForm(meta={'csrf': False}))
+
+    if rule is None:
+      show = Shows(venue_id=venue_id, artist_id=artist_id, start_time=start_time)
+      db.session.add(show)
+      listed = 1
+    else:
+      series = ShowSeries(venue_id=venue_id, artist_id=artist_id,
+                          start_time=dateutil.parser.parse(start_time), **rule)
+      times = series.occurrences()
+      if not times:
+        raise ValueError('the series has no shows')
+      db.session.add(series)
+      db.session.flush()
+      listed = insert_occurrences(series, times)
     db.session.commit()
+    home_sections_stale()
   except:
     error = True
     db.session.rollback()
@@ -562,8 +1722,44 @@ def create_show_submission():
     flash('An error occurred. Show could not be listed.')
   else:
     # on successful db insert, flash success
-    flash('Show was successfully listed!')
-  return render_template('pages/home.html')
+    flash('Show was successfully listed!' if listed == 1 else '%d shows were successfully listed!' % listed)
+  return render_home()
+
+#  Update Show Series
+#  ----------------------------------------------------------------
+
+@app.route('/series/<int:series_id>/edit', methods=['GET'])
+def edit_series(series_id):
+  series = ShowSeries.query.get_or_404(series_id)
+  form = ShowForm(obj=series)
+  form.repeat.data = series.freq
+  form.exceptions.data = ', '.join(day.isoformat() for day in series.exceptions)
+  return render_template('forms/edit_series.html', form=form, series=series)
+
+@app.route('/series/<int:series_id>/edit', methods=['POST'])
+def edit_series_submission(series_id):
+  # changes apply to the shows still to come, past ones are left as they were
+  error = False
+  series = ShowSeries.query.get_or_404(series_id)
+  try:
+    rule = series_rule(ShowForm(meta={'csrf': False}))
+    if rule is None:
+      raise ValueError('a series must repeat')
+    series.venue_id  = request.form['venue_id']
+    series.artist_id = request.form['artist_id']
+    changed = update_future_occurrences(series, rule, dateutil.parser.parse(request.form['start_time']))
+    db.session.commit()
+  except:
+    error = True
+    db.session.rollback()
+    print(sys.exc_info())
+  finally:
+    db.session.close()
+  if error:
+    flash('An error occurred. Show series could not be updated.')
+  else:
+    flash('Show series was successfully updated, %d upcoming shows changed.' % changed)
+  return redirect(url_for('edit_series', series_id=series_id))
 
 #  Shows
 #  ----------------------------------------------------------------
@@ -571,25 +1767,122 @@ def create_show_submission():
 @app.route('/shows')
 def shows():
   # displays list of shows at /shows
-  # replace with real venues data.
-  # num_shows should be aggregated based on number of upcoming shows per venue.
+  data = [ShowRow._make(row) for row in show_rows().order_by(Shows.start_time)]
+
+  return stream_template('pages/shows.html', shows=data)
+
+
+@app.route('/shows.json')
+def shows_json():
+  return json_response([ShowRow._make(row) for row in show_rows().order_by(Shows.start_time)])
+
+
+
+
+@app.route('/autocomplete')
+def autocomplete():
+  # top matching artist and/or venue names for the show form pickers
+  query = request.args.get('q', '')
+  limit = max(1, min(request.args.get('limit', 10, type=int), app.config['AUTOCOMPLETE_MAX_RESULTS']))
+  kind = request.args.get('type')
+  kinds = [kind] if kind in name_indexes else list(name_indexes)
+  return json_response({kind: [NameRow._make(match) for match in name_indexes[kind].search(query, limit)]
+                        for kind in kinds})
+
+
+@app.route('/shows/stream')
+def shows_stream():
+  # server-sent events for shows created, changed or removed by any worker
+  subscription = show_events.subscribe()
+  if subscription is None:
+    abort(503)
+  return Response(show_events.stream(subscription, heartbeat=app.config['SSE_HEARTBEAT']),
+                  mimetype='text/event-stream',
+                  headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/shows/nearby')
+def shows_nearby():
+  # upcoming shows at venues within radius km of (lat, lon), closest first.
+  # venues are narrowed down by geohash prefix and only the nearest ones are
+  # kept, and the shows fetched are capped, so the cost stays bounded
+  try:
+    lat = float(request.args['lat'])
+    lon = float(request.args['lon'])
+    radius = float(request.args.get('radius', app.config['NEARBY_DEFAULT_RADIUS']))
+  except (KeyError, ValueError):
+    abort(400)
+  if not (-90 <= lat <= 90 and -180 <= lon <= 180 and radius > 0):
+    abort(400)
+  radius = min(radius, app.config['NEARBY_MAX_RADIUS'])
+
+  cells = neighbourhood(lat, lon, precision_for_radius(lat, radius))
+  candidates = db.session.query(Venue.id, Venue.latitude, Venue.longitude) \
+                         .filter(db.or_(*[Venue.geohash.like(cell + '%') for cell in cells]))
+  distances = {}
+  for venue_id, venue_lat, venue_lon in candidates:
+    distance = haversine(lat, lon, venue_lat, venue_lon)
+    if distance <= radius:
+      distances[venue_id] = distance
+  nearest = heapq.nsmallest(app.config['NEARBY_MAX_VENUES'], distances, key=distances.get)
+
   data = []
-  shows = Shows.query.all()
-  for show in shows:
-    artist = Artist.query.filter_by(id=show.artist_id).first()
-    venue = Venue.query.filter_by(id=show.venue_id).first()
-    data.append({
-          "venue_id": venue.id,
-          "venue_name": venue.name,
-          "artist_id": artist.id,
-          "artist_name":artist.name,
-          "artist_image_link": artist.image_link,
-          "start_time": str(show.start_time)
-      })
+  if nearest:
+    # closest venue first in the query too, so the cap drops the farthest shows
+    rank = db.case({venue_id: i for i, venue_id in enumerate(nearest)}, value=Shows.venue_id)
+    rows = show_rows().filter(Shows.venue_id.in_(nearest), Shows.start_time > datetime.now()) \
+                      .order_by(rank, Shows.start_time).limit(app.config['NEARBY_MAX_SHOWS'])
+    data = [NearbyShow(*row, round(distances[row[1]], 2)) for row in rows]
 
-  return render_template('pages/shows.html', shows=data)
+  return json_response({"radius_km": radius, "count": len(data), "shows": data})
 
 
+#  Stats
+#  ----------------------------------------------------------------
+
+@app.route('/stats')
+def stats():
+  args = stats_args()
+  return render_template('pages/stats.html', rows=rollup_stats(**args), filters=args,
+                         groups=STATS_GROUPS, genres=list(GENRE_BITS), states=[state for state, _ in state_list])
+
+@app.route('/stats.json')
+def stats_json():
+  args = stats_args()
+  return json_response(dict(args, rows=rollup_stats(**args)))
+
+
+#  Health
+#  ----------------------------------------------------------------
+
+@app.route('/healthz/ready')
+def healthz_ready():
+  # starts the warm-up if nothing has yet, e.g. under the development
+  # server, or again after it couldn't reach the database
+  warmup.start()
+  status = warmup.status()
+  return json_response(status, 200 if status['ready'] else 503)
+
+
+#  Profiles
+#  ----------------------------------------------------------------
+
+@app.route('/profiles')
+def profiles():
+  # recent request profiles; only for whoever may profile requests
+  if not profile_authorized():
+    abort(404)
+  data = [dict(profile, time=datetime.fromtimestamp(profile['time']),
+               links={kind: profile_link(url_for('profile_file', filename=profile['name'] + '.' + kind))
+                      for kind in profile['files']})
+          for profile in recent_profiles(app.config['PROFILE_DIR'], app.config['PROFILE_KEEP'])]
+  return render_template('pages/profiles.html', profiles=data)
+
+@app.route('/profiles/<filename>')
+def profile_file(filename):
+  if not profile_authorized():
+    abort(404)
+  return send_from_directory(app.config['PROFILE_DIR'], filename, as_attachment=True)
 
 
 #  Error Handler
@@ -614,6 +1907,208 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('geocode-venues')
+@click.option('--all', 'everything', is_flag=True, help='Also re-geocode venues that already have coordinates.')
+@click.option('--batch-size', default=500, help='Venues updated per transaction.')
+def geocode_venues_command(everything, batch_size):
+  """Fill in venue coordinates from the gazetteer."""
+  query = Venue.query.order_by(Venue.id)
+  if not everything:
+    query = query.filter(Venue.latitude.is_(None))
+  last_id = 0
+  found = missing = 0
+  while True:
+    batch = query.filter(Venue.id > last_id).limit(batch_size).all()
+    if not batch:
+      break
+    for venue in batch:
+      if geocode(venue):
+        found += 1
+      else:
+        missing += 1
+    last_id = batch[-1].id
+    db.session.commit()
+  click.echo('%d venues geocoded, %d not in the gazetteer' % (found, missing))
+
+@app.cli.command('generate-thumbnails')
+def generate_thumbnails_command():
+  """Generate thumbnails for every venue and artist image."""
+  urls = set()
+  for model in (Venue, Artist):
+    urls.update(url for url, in db.session.query(model.image_link).filter(model.image_link.isnot(None)))
+  for url in sorted(urls):
+    if thumbnails.lookup(url) is None:
+      try:
+        generate_thumbnails(url)
+      except Exception:
+        app.logger.exception('thumbnail generation failed for %s', url)
+
+def sample_template_contexts(rows):
+  # synthetic data shaped like what the controllers pass to each template
+  now = datetime.now()
+  shows = [{
+    "venue_id": i, "venue_name": "Venue %d" % i, "venue_image_link": "https://example.com/v/%d.jpg" % i,
+    "artist_id": i, "artist_name": "Artist %d" % i, "artist_image_link": "https://example.com/a/%d.jpg" % i,
+    "start_time": now + timedelta(hours=i)} for i in range(rows)]
+  profile = {
+    "id": 1, "name": "Sample", "genres": ["Jazz", "Folk"], "address": "1 Main St", "city": "New York",
+    "state": "NY", "phone": "123-123-1234", "website": "https://example.com", "facebook_link": None,
+    "seeking_talent": True, "seeking_venue": True, "seeking_description": "Sample", "image_link": None,
+    "past_shows": shows, "past_shows_count": rows, "upcoming_shows": shows, "upcoming_shows_count": rows}
+  results = {"count": rows, "data": [{"id": i, "name": "Result %d" % i, "num_upcoming_shows": 1} for i in range(rows)]}
+  facets = {"genres": [(genre, rows) for genre in GENRE_BITS], "states": [("NY", rows)],
+            "cities": [("City %d" % i, 10) for i in range(app.config['FACET_CITY_LIMIT'])]}
+  return {
+    'pages/home.html': lambda: {},
+    'pages/show.html': lambda: {},
+    'pages/shows.html': lambda: {'shows': shows},
+    'pages/venues.html': lambda: {'areas': [{"city": "City %d" % a, "state": "NY", "venues": results["data"][a * 10:a * 10 + 10]}
+                                            for a in range(max(1, rows // 10))], 'facets': facets},
+    'pages/artists.html': lambda: {'artists': results["data"], 'facets': facets},
+    'pages/search_venues.html': lambda: {'results': results, 'search_term': 'Result', 'facets': facets},
+    'pages/search_artists.html': lambda: {'results': results, 'search_term': 'Result', 'facets': facets},
+    'pages/show_venue.html': lambda: {'venue': profile},
+    'pages/show_artist.html': lambda: {'artist': profile},
+    'forms/new_venue.html': lambda: {'form': VenueForm()},
+    'forms/new_artist.html': lambda: {'form': ArtistForm()},
+    'forms/new_show.html': lambda: {'form': ShowForm()},
+    'forms/edit_series.html': lambda: {'form': ShowForm(), 'series': {"id": 1}},
+    'forms/edit_venue.html': lambda: {'form': VenueForm(), 'venue': profile},
+    'forms/edit_artist.html': lambda: {'form': ArtistForm(), 'artist': profile},
+    'errors/404.html': lambda: {},
+    'errors/500.html': lambda: {},
+    'errors/429.html': lambda: {},
+    'errors/503.html': lambda: {},
+  }
+
+@app.cli.command('bench-templates')
+@click.option('--rows', default=1000, help='Rows of sample data for list pages.')
+@click.option('--repeat', default=5, help='Renders per template, the best one is reported.')
+def bench_templates_command(rows, repeat):
+  """Time rendering every template with sample data."""
+  with app.test_request_context():
+    for name, make_context in sorted(sample_template_contexts(rows).items()):
+      start = time.perf_counter()
+      template = app.jinja_env.get_template(name)
+      load = time.perf_counter() - start
+      first_chunk = total = float('inf')
+      for _ in range(repeat):
+        context = make_context()
+        app.update_template_context(context)
+        start = time.perf_counter()
+        chunks = template.generate(context)
+        next(chunks)
+        first_chunk = min(first_chunk, time.perf_counter() - start)
+        for _ in chunks:
+          pass
+        total = min(total, time.perf_counter() - start)
+      click.echo('%-26s load %7.2f ms  first chunk %7.2f ms  total %8.2f ms'
+                 % (name, load * 1000, first_chunk * 1000, total * 1000))
+
+@app.cli.command('bench-viewmodels')
+@click.option('--shows', default=100000, help='Rows in the sample /shows listing.')
+def bench_viewmodels_command(shows):
+  """Compare per-row dicts with ShowRow view models for a large listing."""
+  now = datetime.now()
+  rows = [(i, i % 500, 'Venue %d' % (i % 500), i % 2000, 'Artist %d' % (i % 2000),
+           'https://example.com/artists/%d.jpg' % (i % 2000), now + timedelta(hours=i), None) for i in range(shows)]
+  keys = ShowRow._fields
+
+  def as_dicts():
+    return [dict(zip(keys, row)) for row in rows]
+
+  def as_view_models():
+    return [ShowRow._make(row) for row in rows]
+
+  for label, build in (('dicts', as_dicts), ('view models', as_view_models)):
+    start = time.perf_counter()
+    listing = build()
+    built = time.perf_counter() - start
+    del listing
+    tracemalloc.start()
+    listing = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    dumps(listing)
+    encoded = time.perf_counter() - start
+    click.echo('%-12s build %8.1f ms  memory %7.1f MB  json %8.1f ms'
+               % (label, built * 1000, memory / 2 ** 20, encoded * 1000))
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+  """Recompute show_rollups from the shows table."""
+  db.session.execute('SELECT fyyur_rebuild_show_rollups()')
+  db.session.commit()
+  click.echo('%d rollup rows' % ShowRollup.query.count())
+
+@app.cli.command('merge-duplicates')
+@click.argument('kind', type=click.Choice(['venue', 'artist']))
+@click.argument('ids', nargs=-1, type=int)
+@click.option('--threshold', default=None, type=float, help='Similarity for automatic matches.')
+@click.option('--dry-run', is_flag=True, help='Only list what would be merged.')
+@click.option('--yes', is_flag=True, help='Merge the automatic matches instead of only listing them.')
+def merge_duplicates_command(kind, ids, threshold, dry_run, yes):
+  """Merge duplicate venues or artists into the first (or oldest) listing."""
+  if ids:
+    groups = [list(ids)]
+  else:
+    # automatic matches only group listings in the same city and state, and
+    # are merged only with --yes
+    index = DuplicateIndex(threshold=threshold or app.config['DUPLICATE_THRESHOLD'])
+    rows = listing_rows(kind).all()
+    index.build((row.id, listing_features(kind, row)) for row in rows)
+    groups = index.clusters(keys={row.id: place(row.city, row.state) for row in rows})
+    dry_run = dry_run or not yes
+  model = Venue if kind == 'venue' else Artist
+  names = dict(db.session.query(model.id, model.name).filter(model.id.in_([id for group in groups for id in group])))
+  for keep, *duplicates in groups:
+    click.echo('%s %d %r <- %s' % (kind, keep, names.get(keep),
+                                   ', '.join('%d %r' % (id, names.get(id)) for id in duplicates)))
+  if dry_run or not groups:
+    if groups and not ids:
+      click.echo('nothing merged, check the groups and rerun with --yes or with the ids to merge')
+    return
+  # every group in one transaction: either all shows move or none do
+  moved = sum(merge_listings(kind, keep, duplicates) for keep, *duplicates in groups)
+  db.session.commit()
+  click.echo('merged %d %ss, moved %d shows' % (sum(len(group) - 1 for group in groups), kind, moved))
+
+@app.cli.command('profile-link')
+@click.argument('path')
+def profile_link_command(path):
+  """Print a signed link that profiles requests to PATH (or lists profiles, for /profiles)."""
+  if profile_signer is None:
+    raise click.ClickException('signed profile links are disabled, set FYYUR_PROFILE_SECRET')
+  click.echo(profile_link(path))
+
+@app.cli.command('warm-up')
+def warm_up_command():
+  """Run the worker warm-up and print how long each step took."""
+  warmup.start(background=False)
+  for name, seconds in warmup.timings.items():
+    click.echo('%-12s %8.1f ms%s' % (name, seconds * 1000,
+                                     '  failed: ' + warmup.errors[name] if name in warmup.errors else ''))
+
+@app.cli.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty.')
+@click.option('--interval', default=1.0, help='Seconds to sleep while the queue is empty.')
+def worker_command(burst, interval):
+  """Run queued background jobs."""
+  while True:
+    try:
+      ran = run_next_job()
+    finally:
+      db.session.remove()
+    if not ran:
+      if burst:
+        break
+      time.sleep(interval)
+
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
@@ -0,0 +1,146 @@
+#----------------------------------------------------------------------------#
+# Near-duplicate detection (MinHash + LSH).
+#----------------------------------------------------------------------------#
+
+import hashlib
+import random
+import re
+import threading
+
+WORD = re.compile(r'\w+')
+# words that don't tell two listings apart ("The Musical Hop" and
+# "Musical Hop, The" should look the same)
+STOPWORDS = {'the', 'a', 'an', 'and', 'of', 'at'}
+
+
+def words(text):
+  return [word for word in WORD.findall((text or '').lower()) if word not in STOPWORDS]
+
+
+def place(city, state):
+  return ' '.join(words(city)), ' '.join(words(state))
+
+
+def shingles(name, city='', state='', address=''):
+  # name and address as word trigrams, so word order and small typos only
+  # change a few shingles; city and state as a single shingle
+  features = {'l:%s|%s' % place(city, state)}
+  for field, text in (('n', name), ('a', address)):
+    for word in words(text):
+      padded = ' %s ' % word
+      features.update('%s:%s' % (field, padded[i:i + 3]) for i in range(len(padded) - 2))
+  return features
+
+
+class DuplicateIndex(object):
+  # MinHash signatures of every record, bucketed by band: records whose
+  # signatures agree on all rows of any band are candidates, and candidates
+  # are kept when their estimated Jaccard similarity reaches `threshold`.
+  # A lookup touches `bands` buckets instead of every record.
+
+  def __init__(self, num_perm=64, bands=16, threshold=0.6, seed=1):
+    assert num_perm % bands == 0
+    self.num_perm = num_perm
+    self.bands = bands
+    self.rows = num_perm // bands
+    self.threshold = threshold
+    # each "permutation" XORs the 64-bit feature hashes with its own random
+    # mask, which keeps the min() loop in C; the same seed everywhere keeps
+    # signatures comparable across workers
+    rng = random.Random(seed)
+    self.masks = [rng.getrandbits(64) for _ in range(num_perm)]
+    self.signatures = {}
+    self.buckets = [{} for _ in range(bands)]
+    self.lock = threading.Lock()
+
+  def signature(self, features):
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+              for feature in features]
+    if not hashes:
+      return None
+    return tuple(min(map(mask.__xor__, hashes)) for mask in self.masks)
+
+  def band_keys(self, signature):
+    return [signature[band * self.rows:(band + 1) * self.rows] for band in range(self.bands)]
+
+  def similarity(self, one, other):
+    return sum(1 for x, y in zip(one, other) if x == y) / float(self.num_perm)
+
+  def build(self, rows):
+    # rows of (id, features)
+    signatures = {}
+    buckets = [{} for _ in range(self.bands)]
+    for id, features in rows:
+      signature = self.signature(features)
+      if signature is None:
+        continue
+      signatures[id] = signature
+      for band, key in enumerate(self.band_keys(signature)):
+        buckets[band].setdefault(key, set()).add(id)
+    with self.lock:
+      self.signatures = signatures
+      self.buckets = buckets
+
+  def add(self, id, features):
+    signature = self.signature(features)
+    with self.lock:
+      self._remove(id)
+      if signature is None:
+        return
+      self.signatures[id] = signature
+      for band, key in enumerate(self.band_keys(signature)):
+        self.buckets[band].setdefault(key, set()).add(id)
+
+  def remove(self, id):
+    with self.lock:
+      self._remove(id)
+
+  def _remove(self, id):
+    signature = self.signatures.pop(id, None)
+    if signature is None:
+      return
+    for band, key in enumerate(self.band_keys(signature)):
+      bucket = self.buckets[band].get(key)
+      if bucket is not None:
+        bucket.discard(id)
+        if not bucket:
+          del self.buckets[band][key]
+
+  def _matches(self, signature, exclude=None):
+    candidates = set()
+    for band, key in enumerate(self.band_keys(signature)):
+      candidates.update(self.buckets[band].get(key, ()))
+    candidates.discard(exclude)
+    matches = [(id, self.similarity(signature, self.signatures[id])) for id in candidates]
+    return sorted([match for match in matches if match[1] >= self.threshold],
+                  key=lambda match: (-match[1], match[0]))
+
+  def query(self, features, exclude=None):
+    # (id, similarity) of likely duplicates, most similar first
+    signature = self.signature(features)
+    if signature is None:
+      return []
+    with self.lock:
+      return self._matches(signature, exclude)
+
+  def clusters(self, keys=None):
+    # groups of a listing and the likely duplicates that match it directly,
+    # lowest id first and each sorted. Matches are not chained: A~B and B~C
+    # don't put A and C together. With `keys` (id -> key), only listings with
+    # the same key are grouped.
+    keys = keys or {}
+    groups = []
+    grouped = set()
+    with self.lock:
+      for id in sorted(self.signatures):
+        if id in grouped:
+          continue
+        group = [id] + [other for other, _ in self._matches(self.signatures[id], id)
+                        if other not in grouped and keys.get(other) == keys.get(id)]
+        if len(group) > 1:
+          grouped.update(group)
+          groups.append(sorted(group))
+    return groups
+
+  def __len__(self):
+    return len(self.signatures)
@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------------#
+# Server-sent event fan-out.
+#----------------------------------------------------------------------------#
+
+import json
+import queue
+import threading
+
+
+class Subscription(object):
+
+  def __init__(self, max_queue):
+    self.queue = queue.Queue(maxsize=max_queue)
+    self.overflowed = False
+
+
+class EventHub(object):
+  # One published event is copied into every subscriber's bounded queue. A
+  # subscriber that falls max_queue events behind is dropped instead of
+  # buffering without limit; its browser reconnects on its own.
+
+  def __init__(self, max_queue=100, max_subscribers=5000, encode=json.dumps):
+    self.max_queue = max_queue
+    self.max_subscribers = max_subscribers
+    self.encode = encode
+    self.subscriptions = set()
+    self.lock = threading.Lock()
+
+  def subscribe(self):
+    with self.lock:
+      if len(self.subscriptions) >= self.max_subscribers:
+        return None
+      subscription = Subscription(self.max_queue)
+      self.subscriptions.add(subscription)
+      return subscription
+
+  def unsubscribe(self, subscription):
+    with self.lock:
+      self.subscriptions.discard(subscription)
+
+  def publish(self, name, data):
+    # encoded once, whatever the number of subscribers
+    message = 'event: %s\ndata: %s\n\n' % (name, self.encode(data))
+    with self.lock:
+      subscriptions = list(self.subscriptions)
+    for subscription in subscriptions:
+      try:
+        subscription.queue.put_nowait(message)
+      except queue.Full:
+        subscription.overflowed = True
+        self.unsubscribe(subscription)
+
+  def stream(self, subscription, heartbeat=15, retry=5000):
+    # text/event-stream body for one subscriber, with a comment line every
+    # `heartbeat` seconds so proxies keep idle connections open
+    try:
+      yield 'retry: %d\n\n' % retry
+      while not subscription.overflowed:
+        try:
+          message = subscription.queue.get(timeout=heartbeat)
+        except queue.Empty:
+          yield ': heartbeat\n\n'
+          continue
+        yield message
+    finally:
+      self.unsubscribe(subscription)
+
+  def __len__(self):
+    return len(self.subscriptions)
@@ -1,3 +1,5 @@
+import time
+
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -42,11 +44,31 @@ def heroku_test():
     )
 
 
+def wait_ready(url=None, timeout=300):
+    # the new workers answer 200 once they've warmed up
+    if url is None:
+        info = local("heroku apps:info -s", capture=True)
+        url = dict(line.split("=", 1) for line in info.splitlines() if "=" in line)["web_url"]
+    url = url.rstrip("/")
+    deadline = time.time() + float(timeout)
+    while True:
+        with settings(warn_only=True):
+            result = local(
+                "curl -fsS -o /dev/null {}/healthz/ready".format(url), capture=True
+            )
+        if result.succeeded:
+            return
+        if time.time() > deadline:
+            abort("Not ready after {} seconds.".format(timeout))
+        time.sleep(2)
+
+
 def deploy():
     pull()
     test()
     commit()
     heroku()
+    wait_ready()
     heroku_test()
 
 # rollback
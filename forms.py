@@ -1,8 +1,9 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, DateField
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, Optional, NumberRange
 
+# a genre's position here is its bit in genre_mask: only ever append
 genres_list = [
             ('Alternative', 'Alternative'),
             ('Blues', 'Blues'),
@@ -164,4 +165,24 @@ class ShowForm(Form):
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
-    )
\ No newline at end of file
+    )
+    # recurrence: a repeating show is stored as a series and expanded into
+    # one show per occurrence
+    repeat = SelectField(
+        'repeat',
+        choices=[('', 'Does not repeat'), ('weekly', 'Weekly'), ('monthly', 'Monthly')],
+        default=''
+    )
+    interval = IntegerField(
+        'interval', validators=[Optional(), NumberRange(min=1)],
+        default=1
+    )
+    until = DateField(
+        'until', validators=[Optional()]
+    )
+    count = IntegerField(
+        'count', validators=[Optional(), NumberRange(min=1)]
+    )
+    exceptions = StringField(
+        'exceptions'
+    )
@@ -0,0 +1,109 @@
+#----------------------------------------------------------------------------#
+# Geohash and distance helpers.
+#----------------------------------------------------------------------------#
+
+import csv
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# approximate cell (width, height) in km at the equator, by precision
+CELL_SIZES = {
+  1: (5009.4, 4992.6),
+  2: (1252.3, 624.1),
+  3: (156.5, 156.0),
+  4: (39.1, 19.5),
+  5: (4.89, 4.87),
+  6: (1.22, 0.61),
+  7: (0.153, 0.152),
+}
+
+
+def haversine(lat1, lon1, lat2, lon2):
+  lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+  a = math.sin((lat2 - lat1) / 2) ** 2 + \
+      math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def encode(lat, lon, precision=12):
+  lat_range = [-90.0, 90.0]
+  lon_range = [-180.0, 180.0]
+  geohash = []
+  bits = 0
+  bit_count = 0
+  even = True
+  while len(geohash) < precision:
+    rng, value = (lon_range, lon) if even else (lat_range, lat)
+    mid = (rng[0] + rng[1]) / 2
+    bits <<= 1
+    if value >= mid:
+      bits |= 1
+      rng[0] = mid
+    else:
+      rng[1] = mid
+    even = not even
+    bit_count += 1
+    if bit_count == 5:
+      geohash.append(BASE32[bits])
+      bits = 0
+      bit_count = 0
+  return ''.join(geohash)
+
+
+def bounds(geohash):
+  lat_range = [-90.0, 90.0]
+  lon_range = [-180.0, 180.0]
+  even = True
+  for char in geohash:
+    bits = BASE32.index(char)
+    for shift in range(4, -1, -1):
+      rng = lon_range if even else lat_range
+      mid = (rng[0] + rng[1]) / 2
+      if bits >> shift & 1:
+        rng[0] = mid
+      else:
+        rng[1] = mid
+      even = not even
+  return lat_range, lon_range
+
+
+def precision_for_radius(lat, radius_km):
+  # the finest precision whose cells are still at least radius_km across, so
+  # a cell and its eight neighbours cover the whole search circle
+  shrink = max(math.cos(math.radians(lat)), 0.01)
+  for precision in sorted(CELL_SIZES, reverse=True):
+    width, height = CELL_SIZES[precision]
+    if width * shrink >= radius_km and height >= radius_km:
+      return precision
+  return 1
+
+
+def neighbourhood(lat, lon, precision):
+  # the cell containing (lat, lon) plus the eight cells around it
+  center = encode(lat, lon, precision)
+  (lat_min, lat_max), (lon_min, lon_max) = bounds(center)
+  lat_step = lat_max - lat_min
+  lon_step = lon_max - lon_min
+  mid_lat = (lat_min + lat_max) / 2
+  mid_lon = (lon_min + lon_max) / 2
+  cells = set()
+  for dlat in (-1, 0, 1):
+    for dlon in (-1, 0, 1):
+      cell_lat = mid_lat + dlat * lat_step
+      if not -90 <= cell_lat <= 90:
+        continue
+      cell_lon = (mid_lon + dlon * lon_step + 180) % 360 - 180
+      cells.add(encode(cell_lat, cell_lon, precision))
+  return sorted(cells)
+
+
+def load_gazetteer(path):
+  # csv with city, state, latitude, longitude columns
+  places = {}
+  with open(path, newline='') as f:
+    for row in csv.DictReader(f):
+      key = (row['city'].strip().lower(), row['state'].strip().upper())
+      places[key] = (float(row['latitude']), float(row['longitude']))
+  return places
@@ -0,0 +1,21 @@
+# gunicorn reads this from the working directory.
+
+import os
+
+# /shows keeps an EventSource open per viewer. A sync worker would be taken
+# up by a single stream and killed after `timeout`; gthread serves each
+# stream from one of `threads` threads while the worker keeps reporting in.
+# SSE_MAX_SUBSCRIBERS in config.py stays below `threads`, leaving threads
+# for pages.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 64))
+
+
+def post_worker_init(worker):
+    # warm up in each worker once it has loaded the app, never in the
+    # master: with --preload the master imports the app too, but threads it
+    # started wouldn't survive the fork
+    from app import app, warmup
+
+    if app.config['WARM_UP_ENABLED']:
+        warmup.start()
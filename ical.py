@@ -0,0 +1,56 @@
+#----------------------------------------------------------------------------#
+# iCalendar (RFC 5545) output.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+
+def escape(text):
+  return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,') \
+                     .replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+  # content lines are limited to 75 octets, continuations start with a space
+  data = line.encode('utf-8')
+  if len(data) <= 75:
+    return line
+  parts = []
+  limit = 75
+  while data:
+    cut = min(limit, len(data))
+    # don't split a multi-byte character
+    while cut < len(data) and data[cut] & 0xC0 == 0x80:
+      cut -= 1
+    parts.append(data[:cut].decode('utf-8'))
+    data = data[cut:]
+    limit = 74
+  return '\r\n '.join(parts)
+
+
+def calendar(name, events, prodid='-//Fyyur//Shows//EN'):
+  # events: dicts with uid, start (naive datetime, floating local time),
+  # summary, and optional location and url
+  stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+  lines = [
+    'BEGIN:VCALENDAR',
+    'VERSION:2.0',
+    'PRODID:' + prodid,
+    'CALSCALE:GREGORIAN',
+    'X-WR-CALNAME:' + escape(name),
+  ]
+  for event in events:
+    lines += [
+      'BEGIN:VEVENT',
+      'UID:' + event['uid'],
+      'DTSTAMP:' + stamp,
+      'DTSTART:' + event['start'].strftime('%Y%m%dT%H%M%S'),
+      'SUMMARY:' + escape(event['summary']),
+    ]
+    if event.get('location'):
+      lines.append('LOCATION:' + escape(event['location']))
+    if event.get('url'):
+      lines.append('URL:' + event['url'])
+    lines.append('END:VEVENT')
+  lines.append('END:VCALENDAR')
+  return '\r\n'.join(fold(line) for line in lines) + '\r\n'
@@ -0,0 +1,78 @@
+"""empty message
+
+Revision ID: b8d4e6f2c391
+Revises: f6b0d83e2a17
+Create Date: 2026-10-19 19:47:26.902318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4e6f2c391'
+down_revision = 'f6b0d83e2a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # UPDATE notifications list the columns they changed in "fields", and
+    # updates that change nothing don't notify at all
+    op.execute("""
+    CREATE OR REPLACE FUNCTION fyyur_notify_change() RETURNS trigger AS $$
+    DECLARE
+      changed RECORD;
+      payload JSONB;
+      fields JSONB;
+    BEGIN
+      IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+      ELSE
+        changed := NEW;
+      END IF;
+      payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', changed.id);
+      IF TG_OP = 'UPDATE' THEN
+        SELECT coalesce(jsonb_agg(new_column.key), '[]'::jsonb) INTO fields
+          FROM jsonb_each(to_jsonb(NEW)) AS new_column
+         WHERE new_column.value IS DISTINCT FROM to_jsonb(OLD) -> new_column.key;
+        IF fields = '[]'::jsonb THEN
+          RETURN NULL;
+        END IF;
+        payload := payload || jsonb_build_object('fields', fields);
+      END IF;
+      IF TG_TABLE_NAME = 'shows' THEN
+        payload := payload || jsonb_build_object('venue_id', changed.venue_id, 'artist_id', changed.artist_id);
+      ELSE
+        payload := payload || jsonb_build_object('name', changed.name);
+      END IF;
+      PERFORM pg_notify('fyyur_changes', payload::text);
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+
+def downgrade():
+    op.execute("""
+    CREATE OR REPLACE FUNCTION fyyur_notify_change() RETURNS trigger AS $$
+    DECLARE
+      changed RECORD;
+      payload JSONB;
+    BEGIN
+      IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+      ELSE
+        changed := NEW;
+      END IF;
+      payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', changed.id);
+      IF TG_TABLE_NAME = 'shows' THEN
+        payload := payload || jsonb_build_object('venue_id', changed.venue_id, 'artist_id', changed.artist_id);
+      ELSE
+        payload := payload || jsonb_build_object('name', changed.name);
+      END IF;
+      PERFORM pg_notify('fyyur_changes', payload::text);
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
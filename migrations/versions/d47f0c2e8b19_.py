@@ -0,0 +1,55 @@
+"""empty message
+
+Revision ID: d47f0c2e8b19
+Revises: b3c8e5f1a6d2
+Create Date: 2026-10-19 14:26:18.094733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd47f0c2e8b19'
+down_revision = 'b3c8e5f1a6d2'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists', 'shows')
+
+
+def upgrade():
+    # must match CHANNEL in notifications.py
+    op.execute("""
+    CREATE OR REPLACE FUNCTION fyyur_notify_change() RETURNS trigger AS $$
+    DECLARE
+      changed RECORD;
+      payload JSONB;
+    BEGIN
+      IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+      ELSE
+        changed := NEW;
+      END IF;
+      payload := jsonb_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', changed.id);
+      IF TG_TABLE_NAME = 'shows' THEN
+        payload := payload || jsonb_build_object('venue_id', changed.venue_id, 'artist_id', changed.artist_id);
+      ELSE
+        payload := payload || jsonb_build_object('name', changed.name);
+      END IF;
+      PERFORM pg_notify('fyyur_changes', payload::text);
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+    for table in TABLES:
+        op.execute(
+            'CREATE TRIGGER {0}_notify_change AFTER INSERT OR UPDATE OR DELETE ON {0} '
+            'FOR EACH ROW EXECUTE PROCEDURE fyyur_notify_change()'.format(table)
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute('DROP TRIGGER IF EXISTS {0}_notify_change ON {0}'.format(table))
+    op.execute('DROP FUNCTION IF EXISTS fyyur_notify_change()')
@@ -0,0 +1,74 @@
+#----------------------------------------------------------------------------#
+# PostgreSQL change notifications.
+#----------------------------------------------------------------------------#
+
+import json
+import logging
+import select
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+# the channel the triggers in migrations/ notify
+CHANNEL = 'fyyur_changes'
+
+
+class ChangeListener(threading.Thread):
+  # LISTENs on a channel from a dedicated connection and hands each decoded
+  # payload to on_change. Notifications sent while disconnected are lost, so
+  # on_gap is called every time the LISTEN is (re)established and callers
+  # fall back to flushing everything they cache.
+
+  def __init__(self, dsn, on_change, on_gap, channel=CHANNEL,
+               poll_timeout=5, reconnect_delay=1, max_reconnect_delay=30):
+    super(ChangeListener, self).__init__(name='change-listener', daemon=True)
+    self.dsn = dsn
+    self.channel = channel
+    self.on_change = on_change
+    self.on_gap = on_gap
+    self.poll_timeout = poll_timeout
+    self.reconnect_delay = reconnect_delay
+    self.max_reconnect_delay = max_reconnect_delay
+    self.stopped = threading.Event()
+
+  def stop(self):
+    self.stopped.set()
+
+  def run(self):
+    delay = self.reconnect_delay
+    while not self.stopped.is_set():
+      connection = None
+      try:
+        connection = psycopg2.connect(self.dsn)
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        connection.cursor().execute('LISTEN %s' % self.channel)
+        self.on_gap()
+        delay = self.reconnect_delay
+        self.listen(connection)
+      except Exception:
+        logger.exception('change listener disconnected, retrying in %ss', delay)
+        self.stopped.wait(delay)
+        delay = min(delay * 2, self.max_reconnect_delay)
+      finally:
+        if connection is not None:
+          connection.close()
+
+  def listen(self, connection):
+    while not self.stopped.is_set():
+      if select.select([connection], [], [], self.poll_timeout) == ([], [], []):
+        # idle: make sure the connection is still alive, a dead one raises
+        # and sends us through reconnect and a full flush
+        connection.cursor().execute('SELECT 1')
+        continue
+      connection.poll()
+      while connection.notifies:
+        notify = connection.notifies.pop(0)
+        try:
+          self.on_change(json.loads(notify.payload))
+        except Exception:
+          # the change may not have been applied, don't keep stale data
+          logger.exception('change handler failed for %s', notify.payload)
+          self.on_gap()
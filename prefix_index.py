@@ -0,0 +1,83 @@
+#----------------------------------------------------------------------------#
+# In-memory name prefix index.
+#----------------------------------------------------------------------------#
+
+import bisect
+import re
+import threading
+
+WORD = re.compile(r'\w+')
+
+
+def normalize(text):
+  return ' '.join(WORD.findall(text.lower()))
+
+
+class PrefixIndex(object):
+  # A sorted array of (key, id) pairs searched with bisect. Every word-start
+  # suffix of a name is a key, so "hop" and "musical h" both find
+  # "The Musical Hop".
+
+  def __init__(self):
+    self.keys = []
+    self.names = {}
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def suffixes(name):
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+  def build(self, rows):
+    keys = []
+    names = {}
+    for id, name in rows:
+      names[id] = name
+      keys.extend((key, id) for key in self.suffixes(name))
+    keys.sort()
+    with self.lock:
+      self.keys = keys
+      self.names = names
+
+  def add(self, id, name):
+    with self.lock:
+      self._remove(id)
+      self.names[id] = name
+      for key in self.suffixes(name):
+        bisect.insort(self.keys, (key, id))
+
+  def remove(self, id):
+    with self.lock:
+      self._remove(id)
+
+  def _remove(self, id):
+    name = self.names.pop(id, None)
+    if name is None:
+      return
+    for key in self.suffixes(name):
+      i = bisect.bisect_left(self.keys, (key, id))
+      if i < len(self.keys) and self.keys[i] == (key, id):
+        del self.keys[i]
+
+  def search(self, prefix, limit=10):
+    # (id, name) of the first `limit` names with a word starting with prefix,
+    # in key order
+    prefix = normalize(prefix)
+    if not prefix:
+      return []
+    results = []
+    seen = set()
+    with self.lock:
+      i = bisect.bisect_left(self.keys, (prefix,))
+      while i < len(self.keys) and len(results) < limit:
+        key, id = self.keys[i]
+        if not key.startswith(prefix):
+          break
+        if id not in seen:
+          seen.add(id)
+          results.append((id, self.names[id]))
+        i += 1
+    return results
+
+  def __len__(self):
+    return len(self.names)
@@ -0,0 +1,143 @@
+#----------------------------------------------------------------------------#
+# Sampling profiler.
+#----------------------------------------------------------------------------#
+
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+# the innermost frame that matches decides a sample's phase, so a query run
+# while rendering a template counts as sql, not jinja
+PHASES = (
+  ('sql', lambda code: '/sqlalchemy/engine/' in code.co_filename or '/psycopg2/' in code.co_filename),
+  ('orm', lambda code: '/sqlalchemy/orm/' in code.co_filename),
+  ('format_datetime', lambda code: code.co_name == 'format_datetime'),
+  ('jinja', lambda code: code.co_filename.endswith('.html') or '/jinja2/' in code.co_filename),
+)
+
+
+def frame_name(code):
+  return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def phase(codes):
+  for code in reversed(codes):
+    for name, matches in PHASES:
+      if matches(code):
+        return name
+  return 'python'
+
+
+class Sampler(threading.Thread):
+  # Samples one thread's stack every `interval` seconds from a background
+  # thread; the profiled thread runs unmodified, no tracing hooks are set.
+
+  def __init__(self, thread_id, interval=0.002):
+    super(Sampler, self).__init__(name='profiler', daemon=True)
+    self.thread_id = thread_id
+    self.interval = interval
+    self.samples = collections.Counter()
+    self.stopped = threading.Event()
+    self.started = self.finished = None
+
+  def run(self):
+    self.started = time.perf_counter()
+    while not self.stopped.wait(self.interval):
+      frame = sys._current_frames().get(self.thread_id)
+      codes = []
+      while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+      if codes:
+        codes.reverse()
+        self.samples[(phase(codes),) + tuple(codes)] += 1
+    self.finished = time.perf_counter()
+
+  def stop(self):
+    self.stopped.set()
+    self.join()
+
+  def collapsed(self):
+    # one "phase;outer;...;inner count" line per distinct stack, the input
+    # format of flamegraph.pl and most flame graph viewers
+    lines = []
+    for (name, *codes), count in sorted(self.samples.items(), key=lambda item: -item[1]):
+      lines.append('%s %d' % (';'.join(['[%s]' % name] + [frame_name(code) for code in codes]), count))
+    return '\n'.join(lines) + '\n'
+
+  def speedscope(self, name):
+    frames = []
+    index = {}
+
+    def frame(key, name, code=None):
+      if key not in index:
+        index[key] = len(frames)
+        entry = {'name': name}
+        if code is not None:
+          entry.update(file=code.co_filename, line=code.co_firstlineno)
+        frames.append(entry)
+      return index[key]
+
+    samples = []
+    weights = []
+    for (phase_name, *codes), count in self.samples.items():
+      samples.append([frame(phase_name, '[%s]' % phase_name)] +
+                     [frame(code, frame_name(code), code) for code in codes])
+      weights.append(count * self.interval)
+    return {
+      '$schema': 'https://www.speedscope.app/file-format-schema.json',
+      'name': name,
+      'exporter': 'fyyur',
+      'shared': {'frames': frames},
+      'profiles': [{
+        'type': 'sampled',
+        'name': name,
+        'unit': 'seconds',
+        'startValue': 0,
+        'endValue': (self.finished or time.perf_counter()) - (self.started or 0),
+        'samples': samples,
+        'weights': weights,
+      }],
+    }
+
+  def phase_totals(self):
+    totals = collections.Counter()
+    for (name, *_), count in self.samples.items():
+      totals[name] += count
+    return totals
+
+
+def write_profile(directory, name, sampler, keep=200):
+  # <name>.collapsed.txt and <name>.speedscope.json, then drop all but the
+  # `keep` most recent profiles
+  os.makedirs(directory, exist_ok=True)
+  with open(os.path.join(directory, name + '.collapsed.txt'), 'w') as f:
+    f.write(sampler.collapsed())
+  with open(os.path.join(directory, name + '.speedscope.json'), 'w') as f:
+    json.dump(sampler.speedscope(name), f)
+  for old in recent_profiles(directory)[keep:]:
+    for path in old['files'].values():
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+
+
+def recent_profiles(directory, limit=None):
+  # newest first: {"name", "time", "files": {kind: path}}
+  profiles = {}
+  try:
+    entries = list(os.scandir(directory))
+  except FileNotFoundError:
+    return []
+  for entry in entries:
+    name, _, kind = entry.name.partition('.')
+    if kind not in ('collapsed.txt', 'speedscope.json'):
+      continue
+    profile = profiles.setdefault(name, {'name': name, 'time': 0, 'files': {}})
+    profile['files'][kind] = entry.path
+    profile['time'] = max(profile['time'], entry.stat().st_mtime)
+  return sorted(profiles.values(), key=lambda profile: -profile['time'])[:limit]
@@ -0,0 +1,126 @@
+#----------------------------------------------------------------------------#
+# Rate limiting and load shedding.
+#----------------------------------------------------------------------------#
+
+import collections
+import math
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import text
+
+
+class MemoryBackend(object):
+  # Token buckets for this worker only, least recently used first. Beyond
+  # max_keys the least recently used bucket is dropped; it is most likely
+  # full again by then anyway.
+
+  def __init__(self, max_keys=100000):
+    self.buckets = collections.OrderedDict()
+    self.max_keys = max_keys
+    self.lock = threading.Lock()
+
+  def take(self, key, rate, burst, cost=1):
+    # (allowed, seconds until `cost` tokens are available)
+    now = time.monotonic()
+    with self.lock:
+      tokens, updated = self.buckets.pop(key, (burst, now))
+      tokens = min(burst, tokens + (now - updated) * rate)
+      allowed = tokens >= cost
+      if allowed:
+        tokens -= cost
+      while len(self.buckets) >= self.max_keys:
+        self.buckets.popitem(last=False)
+      self.buckets[key] = (tokens, now)
+    return allowed, 0 if allowed else (cost - tokens) / rate
+
+
+class PostgresBackend(object):
+  # Token buckets shared by every worker, one row per key in the unlogged
+  # rate_limits table, refilled and charged by a single upsert.
+
+  TAKE = text("""
+    INSERT INTO rate_limits (key, tokens, allowed, updated_at)
+    VALUES (:key, :burst - :cost, true, clock_timestamp())
+    ON CONFLICT (key) DO UPDATE SET
+      allowed = least(:burst, rate_limits.tokens + extract(epoch FROM clock_timestamp() - rate_limits.updated_at) * :rate) >= :cost,
+      tokens = least(:burst, rate_limits.tokens + extract(epoch FROM clock_timestamp() - rate_limits.updated_at) * :rate)
+               - CASE WHEN least(:burst, rate_limits.tokens + extract(epoch FROM clock_timestamp() - rate_limits.updated_at) * :rate) >= :cost
+                      THEN :cost ELSE 0 END,
+      updated_at = clock_timestamp()
+    RETURNING allowed, tokens
+  """)
+
+  # rows idle for max_idle seconds hold full buckets, dropping them changes
+  # nothing; each worker deletes them every cleanup_interval seconds
+  CLEANUP = text("""
+    DELETE FROM rate_limits WHERE updated_at < clock_timestamp() - make_interval(secs => :max_idle)
+  """)
+
+  def __init__(self, engine, max_idle=3600, cleanup_interval=300):
+    self.engine = engine
+    self.max_idle = max_idle
+    self.cleanup_interval = cleanup_interval
+    self.cleaned = time.monotonic()
+    self.lock = threading.Lock()
+
+  def take(self, key, rate, burst, cost=1):
+    with self.engine.begin() as connection:
+      allowed, tokens = connection.execute(self.TAKE, key=key, rate=rate, burst=burst, cost=cost).first()
+    self.maybe_cleanup()
+    return allowed, 0 if allowed else (cost - tokens) / rate
+
+  def maybe_cleanup(self):
+    now = time.monotonic()
+    with self.lock:
+      if now - self.cleaned < self.cleanup_interval:
+        return
+      self.cleaned = now
+    self.cleanup()
+
+  def cleanup(self):
+    with self.engine.begin() as connection:
+      return connection.execute(self.CLEANUP, max_idle=self.max_idle).rowcount
+
+
+class TimedQueuePool(QueuePool):
+  # A QueuePool that remembers how long checkouts wait for a connection, as
+  # a moving average that decays while nothing checks out.
+
+  half_life = 5.0
+
+  def __init__(self, *args, **kwargs):
+    super(TimedQueuePool, self).__init__(*args, **kwargs)
+    self.average_wait = 0.0
+    self.measured = time.monotonic()
+
+  def _do_get(self):
+    start = time.monotonic()
+    try:
+      return super(TimedQueuePool, self)._do_get()
+    finally:
+      now = time.monotonic()
+      self.average_wait = self.current_wait(now) * 0.8 + (now - start) * 0.2
+      self.measured = now
+
+  def current_wait(self, now=None):
+    elapsed = (now or time.monotonic()) - self.measured
+    return self.average_wait * math.pow(0.5, elapsed / self.half_life)
+
+
+class InFlight(object):
+  # requests this worker is currently handling
+
+  def __init__(self):
+    self.count = 0
+    self.lock = threading.Lock()
+
+  def enter(self):
+    with self.lock:
+      self.count += 1
+      return self.count
+
+  def leave(self):
+    with self.lock:
+      self.count -= 1
@@ -0,0 +1,34 @@
+#----------------------------------------------------------------------------#
+# Recurring shows.
+#----------------------------------------------------------------------------#
+
+import re
+from datetime import datetime, time
+
+from dateutil.rrule import rrule, WEEKLY, MONTHLY
+
+FREQUENCIES = {'weekly': WEEKLY, 'monthly': MONTHLY}
+DATE_SEPARATOR = re.compile(r'[\s,]+')
+
+
+def occurrences(start, freq, interval=1, until=None, count=None, exceptions=(), limit=520):
+  # start times of a series, RRULE style: `count` includes the exception
+  # dates (they are removed afterwards, like EXDATE) and `until` is a date,
+  # the last day an occurrence may fall on
+  if until is not None:
+    until = datetime.combine(until, time.max)
+  rule = rrule(FREQUENCIES[freq], dtstart=start, interval=interval, until=until, count=count)
+  skipped = set(exceptions or ())
+  times = []
+  for when in rule:
+    if len(times) >= limit:
+      break
+    if when.date() not in skipped:
+      times.append(when)
+  return times
+
+
+def parse_dates(text):
+  # "2026-12-24, 2026-12-31" -> [date, date]; ValueError on anything else
+  return sorted({datetime.strptime(value, '%Y-%m-%d').date()
+                 for value in DATE_SEPARATOR.split(text or '') if value})
@@ -0,0 +1,39 @@
+// Typeahead for inputs with data-autocomplete="artist|venue": suggestions
+// come from /autocomplete and picking one fills the id input named in
+// data-target.
+(function() {
+  var inputs = document.querySelectorAll('input[data-autocomplete]');
+  for (var i = 0; i < inputs.length; i++) {
+    setup(inputs[i]);
+  }
+
+  function setup(input) {
+    var type = input.dataset.autocomplete;
+    var target = document.getElementById(input.dataset.target);
+    var list = document.getElementById(input.getAttribute('list'));
+    var pending = null;
+
+    input.addEventListener('input', function() {
+      var match = /#(\d+)$/.exec(input.value);
+      if (match) {
+        target.value = match[1];
+        return;
+      }
+      if (pending) {
+        pending.abort();
+      }
+      pending = new AbortController();
+      fetch('/autocomplete?type=' + type + '&q=' + encodeURIComponent(input.value), { signal: pending.signal })
+        .then(function(response) { return response.json(); })
+        .then(function(data) {
+          list.innerHTML = '';
+          data[type].forEach(function(item) {
+            var option = document.createElement('option');
+            option.value = item.name + ' #' + item.id;
+            list.appendChild(option);
+          });
+        })
+        .catch(function() {});
+    });
+  }
+})();
@@ -0,0 +1,66 @@
+// Keeps the /shows grid current: tiles are added, replaced or removed as
+// shows change, using events from /shows/stream.
+(function() {
+  var grid = document.querySelector('[data-stream]');
+  if (!grid || !window.EventSource) {
+    return;
+  }
+  var source = new EventSource(grid.dataset.stream);
+
+  function tile(show) {
+    var column = document.createElement('div');
+    column.className = 'col-sm-4';
+    column.dataset.showId = show.id;
+    var box = document.createElement('div');
+    box.className = 'tile tile-show';
+    column.appendChild(box);
+
+    var image = document.createElement('img');
+    image.src = show.artist_image_link || '';
+    image.alt = 'Artist Image';
+    box.appendChild(image);
+    append(box, 'h4', show.start_time_display);
+    append(append(box, 'h5'), 'a', show.artist_name).href = '/artists/' + show.artist_id;
+    append(box, 'p', 'playing at');
+    append(append(box, 'h5'), 'a', show.venue_name).href = '/venues/' + show.venue_id;
+    if (show.series_id) {
+      append(append(box, 'p'), 'a', 'Edit series').href = '/series/' + show.series_id + '/edit';
+    }
+    return column;
+  }
+
+  function append(parent, tag, text) {
+    var element = document.createElement(tag);
+    if (text !== undefined) {
+      element.textContent = text;
+    }
+    parent.appendChild(element);
+    return element;
+  }
+
+  function find(id) {
+    return grid.querySelector('[data-show-id="' + id + '"]');
+  }
+
+  source.addEventListener('show_created', function(e) {
+    var show = JSON.parse(e.data);
+    if (!find(show.id)) {
+      grid.appendChild(tile(show));
+    }
+  });
+  source.addEventListener('show_updated', function(e) {
+    var show = JSON.parse(e.data);
+    var existing = find(show.id);
+    if (existing) {
+      grid.replaceChild(tile(show), existing);
+    } else {
+      grid.appendChild(tile(show));
+    }
+  });
+  source.addEventListener('show_removed', function(e) {
+    var existing = find(JSON.parse(e.data).id);
+    if (existing) {
+      grid.removeChild(existing);
+    }
+  });
+})();
@@ -0,0 +1,95 @@
+from duplicates import DuplicateIndex, shingles, words, place
+
+
+def features(name, city='San Francisco', state='CA', address=''):
+  return shingles(name, city, state, address)
+
+
+def test_words_drop_stopwords_and_punctuation():
+  assert words('The Musical Hop, SF!') == ['musical', 'hop', 'sf']
+  assert words(None) == []
+
+
+def test_shingles_ignore_word_order_and_stopwords():
+  assert shingles('The Musical Hop') == shingles('Musical Hop, The')
+  assert shingles('Hop', 'San Francisco', 'CA') != shingles('Hop', 'New York', 'NY')
+
+
+def test_signatures_are_the_same_in_every_index():
+  one = DuplicateIndex()
+  other = DuplicateIndex()
+  assert one.signature(features('The Musical Hop')) == other.signature(features('The Musical Hop'))
+  assert one.signature(set()) is None
+
+
+def test_identical_listings_match_fully():
+  index = DuplicateIndex()
+  index.build([(1, features('The Musical Hop', address='1015 Folsom Street'))])
+  assert index.query(features('Musical Hop, The', address='1015 Folsom Street')) == [(1, 1.0)]
+
+
+def test_near_duplicates_match_and_different_listings_dont():
+  index = DuplicateIndex()
+  index.build([
+    (1, features('The Musical Hop', address='1015 Folsom Street')),
+    (2, features('Park Square Live Music & Coffee', 'San Francisco', 'CA', '34 Whiskey Moore Ave')),
+    (3, features('The Dueling Pianos Bar', 'New York', 'NY', '335 Delancey Street')),
+  ])
+  matches = index.query(features('The Musical Hopp', address='1015 Folsom St'))
+  assert [id for id, _ in matches] == [1]
+  assert index.threshold <= matches[0][1] < 1
+  assert index.query(features('Totally Different Place', 'Austin', 'TX', '1 Main Road')) == []
+
+
+def test_threshold_filters_candidates():
+  strict = DuplicateIndex(threshold=0.99)
+  strict.build([(1, features('The Musical Hop', address='1015 Folsom Street'))])
+  assert strict.query(features('The Musical Hopp', address='1015 Folsom St')) == []
+
+
+def test_query_excludes_the_listing_itself():
+  index = DuplicateIndex()
+  index.build([(1, features('The Musical Hop'))])
+  assert index.query(features('The Musical Hop'), exclude=1) == []
+
+
+def test_add_and_remove():
+  index = DuplicateIndex()
+  index.add(1, features('The Musical Hop'))
+  index.add(1, features('The Dueling Pianos Bar'))
+  assert index.query(features('The Musical Hop')) == []
+  assert [id for id, _ in index.query(features('The Dueling Pianos Bar'))] == [1]
+  index.remove(1)
+  assert len(index) == 0
+  assert all(not bucket for bucket in index.buckets)
+  index.add(2, set())
+  assert len(index) == 0
+
+
+def test_clusters_group_direct_matches_only():
+  index = DuplicateIndex()
+  index.build([
+    (1, features('The Musical Hop')),
+    (5, features('Musical Hop, The')),
+    (7, features('The Musical Hop')),
+    (2, features('The Dueling Pianos Bar', 'New York', 'NY')),
+    (3, features('Park Square Live Music & Coffee')),
+  ])
+  assert index.clusters() == [[1, 5, 7]]
+
+
+def test_clusters_dont_chain():
+  # 1~2 and 2~3, but 1 and 3 aren't alike: 3 is left out of 1's group
+  index = DuplicateIndex(threshold=0.5)
+  index.build([(1, {'a', 'b', 'c', 'd'}), (2, {'a', 'b', 'c', 'd', 'e', 'f'}), (3, {'c', 'd', 'e', 'f'})])
+  assert index.similarity(index.signatures[1], index.signatures[3]) < 0.5
+  assert index.clusters() == [[1, 2]]
+
+
+def test_clusters_respect_keys():
+  index = DuplicateIndex()
+  rows = [(1, 'Guns N Petals', 'San Francisco', 'CA'), (2, 'Guns N Petals', 'New York', 'NY'),
+          (3, 'Guns N Petals', 'San Francisco', 'CA')]
+  index.build((id, features(name, city, state)) for id, name, city, state in rows)
+  assert index.clusters() == [[1, 2, 3]]
+  assert index.clusters(keys={id: place(city, state) for id, _, city, state in rows}) == [[1, 3]]
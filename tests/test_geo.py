@@ -0,0 +1,69 @@
+import pytest
+
+from geo import haversine, encode, bounds, precision_for_radius, neighbourhood, CELL_SIZES
+
+
+def test_haversine_known_distance():
+  # Paris to London
+  assert haversine(48.8566, 2.3522, 51.5074, -0.1278) == pytest.approx(343.5, abs=1)
+
+
+def test_haversine_same_point_and_symmetry():
+  assert haversine(40.7, -74.0, 40.7, -74.0) == 0
+  assert haversine(10, 20, -30, 40) == pytest.approx(haversine(-30, 40, 10, 20))
+
+
+def test_haversine_across_antimeridian():
+  assert haversine(0, 179.5, 0, -179.5) == pytest.approx(111.2, abs=0.5)
+
+
+def test_encode_known_value():
+  assert encode(42.6, -5.6, 5) == 'ezs42'
+  assert encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+
+def test_bounds_contain_encoded_point():
+  for lat, lon in ((42.6, -5.6), (-33.86, 151.21), (89.9, 179.9), (-89.9, -179.9)):
+    (lat_min, lat_max), (lon_min, lon_max) = bounds(encode(lat, lon, 7))
+    assert lat_min <= lat <= lat_max
+    assert lon_min <= lon <= lon_max
+
+
+def test_longer_geohash_is_a_prefix_match():
+  assert encode(37.77, -122.42, 9).startswith(encode(37.77, -122.42, 5))
+
+
+def test_precision_for_radius_covers_the_radius():
+  for radius in (0.1, 1, 10, 100):
+    precision = precision_for_radius(0, radius)
+    width, height = CELL_SIZES[precision]
+    assert width >= radius and height >= radius
+    if precision + 1 in CELL_SIZES:
+      assert min(CELL_SIZES[precision + 1]) < radius
+
+
+def test_precision_for_radius_shrinks_cells_towards_the_poles():
+  assert precision_for_radius(70, 3) < precision_for_radius(0, 3)
+  assert precision_for_radius(90, 1) >= 1
+
+
+def test_neighbourhood_is_the_cell_and_its_eight_neighbours():
+  cells = neighbourhood(42.6, -5.6, 5)
+  assert len(cells) == 9
+  assert 'ezs42' in cells
+  assert all(len(cell) == 5 for cell in cells)
+
+
+def test_neighbourhood_wraps_at_the_antimeridian():
+  cells = neighbourhood(0.01, 179.99, 4)
+  assert len(cells) == 9
+  lons = [sum(bounds(cell)[1]) / 2 for cell in cells]
+  assert any(lon > 179 for lon in lons)
+  assert any(lon < -179 for lon in lons)
+
+
+def test_neighbourhood_stops_at_the_poles():
+  # there is no row of cells above the north pole
+  cells = neighbourhood(89.99, 0, 4)
+  assert len(cells) == 6
+  assert all(bounds(cell)[0][1] <= 90 for cell in cells)
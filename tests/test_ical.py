@@ -0,0 +1,60 @@
+from datetime import datetime
+
+from ical import escape, fold, calendar
+
+
+def unfold(text):
+  return text.replace('\r\n ', '')
+
+
+def test_escape():
+  assert escape(r'a;b,c\d') == r'a\;b\,c\\d'
+  assert escape('one\r\ntwo\nthree') == 'one\\ntwo\\nthree'
+  assert escape(None) == ''
+
+
+def test_short_lines_are_not_folded():
+  line = 'SUMMARY:' + 'x' * 67
+  assert fold(line) == line
+
+
+def test_long_lines_fold_at_75_octets():
+  line = 'SUMMARY:' + 'x' * 200
+  folded = fold(line)
+  parts = folded.split('\r\n')
+  assert len(parts[0].encode('utf-8')) == 75
+  assert all(part.startswith(' ') and len(part.encode('utf-8')) <= 75 for part in parts[1:])
+  assert unfold(folded) == line
+
+
+def test_folding_never_splits_a_character():
+  line = 'SUMMARY:' + 'é♫' * 60
+  folded = fold(line)
+  for part in folded.split('\r\n'):
+    assert len(part.encode('utf-8')) <= 75
+    part.encode('utf-8').decode('utf-8')
+  assert unfold(folded) == line
+
+
+def test_calendar():
+  body = calendar('Hop, The', [{
+    'uid': 'show-1@fyyur',
+    'start': datetime(2026, 5, 21, 21, 30),
+    'summary': 'Guns N Petals at The Musical Hop',
+    'location': 'The Musical Hop, 1015 Folsom Street, San Francisco, CA',
+    'url': 'http://localhost/venues/1',
+  }, {
+    'uid': 'show-2@fyyur',
+    'start': datetime(2026, 6, 1, 20, 0),
+    'summary': 'No location',
+  }])
+  assert body.endswith('\r\n')
+  lines = unfold(body).split('\r\n')[:-1]
+  assert lines[0] == 'BEGIN:VCALENDAR' and lines[-1] == 'END:VCALENDAR'
+  assert 'X-WR-CALNAME:Hop\\, The' in lines
+  assert lines.count('BEGIN:VEVENT') == lines.count('END:VEVENT') == 2
+  assert 'DTSTART:20260521T213000' in lines
+  assert 'LOCATION:The Musical Hop\\, 1015 Folsom Street\\, San Francisco\\, CA' in lines
+  assert 'URL:http://localhost/venues/1' in lines
+  assert sum(line.startswith('LOCATION:') for line in lines) == 1
+  assert all(len(line.encode('utf-8')) <= 75 for line in body.split('\r\n'))
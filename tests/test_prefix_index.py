@@ -0,0 +1,56 @@
+from prefix_index import PrefixIndex, normalize
+
+
+def index(*rows):
+  prefix_index = PrefixIndex()
+  prefix_index.build(rows)
+  return prefix_index
+
+
+def test_normalize():
+  assert normalize('  The Musical-Hop!! ') == 'the musical hop'
+
+
+def test_search_matches_the_start_of_any_word():
+  names = index((1, 'The Musical Hop'), (2, 'Park Square Live Music & Coffee'))
+  assert names.search('hop') == [(1, 'The Musical Hop')]
+  assert names.search('musical h') == [(1, 'The Musical Hop')]
+  # in key order: "music coffee" before "musical hop"
+  assert names.search('MUS') == [(2, 'Park Square Live Music & Coffee'), (1, 'The Musical Hop')]
+  assert names.search('usical') == []
+
+
+def test_search_lists_a_name_once():
+  names = index((1, 'Hop Hop Hop'))
+  assert names.search('hop') == [(1, 'Hop Hop Hop')]
+
+
+def test_search_honours_the_limit_and_empty_prefixes():
+  names = index(*[(id, 'Venue %d' % id) for id in range(20)])
+  assert len(names.search('venue', limit=5)) == 5
+  assert names.search('') == []
+  assert names.search('!!') == []
+
+
+def test_add_replaces_the_old_name():
+  names = index((1, 'The Musical Hop'))
+  names.add(1, 'The Dueling Pianos Bar')
+  assert names.search('hop') == []
+  assert names.search('pianos') == [(1, 'The Dueling Pianos Bar')]
+  assert len(names) == 1
+
+
+def test_remove_drops_every_key_of_the_name():
+  names = index((1, 'The Musical Hop'), (2, 'Musical Chairs'))
+  names.remove(1)
+  assert names.search('musical') == [(2, 'Musical Chairs')]
+  assert names.search('the') == []
+  assert all(id != 1 for _, id in names.keys)
+  names.remove(1)
+  assert len(names) == 1
+
+
+def test_shared_keys_keep_other_ids():
+  names = index((1, 'Jazz'), (2, 'Jazz'))
+  names.remove(1)
+  assert names.search('jazz') == [(2, 'Jazz')]
@@ -0,0 +1,102 @@
+import pytest
+
+import ratelimit
+from ratelimit import MemoryBackend, PostgresBackend, InFlight
+
+
+class Clock(object):
+
+  def __init__(self, now=1000.0):
+    self.now = now
+
+  def __call__(self):
+    return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+  clock = Clock()
+  monkeypatch.setattr(ratelimit.time, 'monotonic', clock)
+  return clock
+
+
+def test_burst_then_refused_with_retry_after(clock):
+  backend = MemoryBackend()
+  assert [backend.take('a', rate=2, burst=3)[0] for _ in range(3)] == [True] * 3
+  allowed, retry_after = backend.take('a', rate=2, burst=3)
+  assert not allowed
+  assert retry_after == pytest.approx(0.5)
+
+
+def test_tokens_refill_at_rate(clock):
+  backend = MemoryBackend()
+  for _ in range(3):
+    backend.take('a', rate=2, burst=3)
+  clock.now += 1
+  assert [backend.take('a', rate=2, burst=3)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_refill_stops_at_burst(clock):
+  backend = MemoryBackend()
+  backend.take('a', rate=1, burst=2)
+  clock.now += 3600
+  assert [backend.take('a', rate=1, burst=2)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_refused_requests_cost_nothing(clock):
+  backend = MemoryBackend()
+  backend.take('a', rate=1, burst=1)
+  for _ in range(5):
+    assert not backend.take('a', rate=1, burst=1)[0]
+  clock.now += 1
+  assert backend.take('a', rate=1, burst=1)[0]
+
+
+def test_cost_and_keys_are_separate(clock):
+  backend = MemoryBackend()
+  assert backend.take('a', rate=1, burst=5, cost=5)[0]
+  allowed, retry_after = backend.take('a', rate=1, burst=5, cost=2)
+  assert not allowed and retry_after == pytest.approx(2)
+  assert backend.take('b', rate=1, burst=5)[0]
+
+
+def test_least_recently_used_bucket_is_dropped(clock):
+  backend = MemoryBackend(max_keys=2)
+  backend.take('a', rate=1, burst=1)
+  backend.take('b', rate=1, burst=1)
+  backend.take('a', rate=1, burst=1)
+  backend.take('c', rate=1, burst=1)
+  assert list(backend.buckets) == ['a', 'c']
+  # a is still spent: new keys don't reset the buckets of active clients
+  assert not backend.take('a', rate=1, burst=1)[0]
+
+
+def test_postgres_cleanup_runs_once_per_interval(clock):
+  backend = PostgresBackend(engine=None, cleanup_interval=300)
+  calls = []
+  backend.cleanup = lambda: calls.append(clock.now)
+  backend.maybe_cleanup()
+  clock.now += 299
+  backend.maybe_cleanup()
+  clock.now += 2
+  backend.maybe_cleanup()
+  backend.maybe_cleanup()
+  assert calls == [1301.0]
+
+
+def test_in_flight():
+  in_flight = InFlight()
+  assert in_flight.enter() == 1
+  assert in_flight.enter() == 2
+  in_flight.leave()
+  assert in_flight.count == 1
+
+
+def test_pool_wait_decays_while_idle(clock):
+  pool = ratelimit.TimedQueuePool(lambda: None, pool_size=1)
+  pool.average_wait = 1.0
+  pool.measured = clock.now
+  clock.now += pool.half_life
+  assert pool.current_wait() == pytest.approx(0.5)
+  clock.now += pool.half_life
+  assert pool.current_wait() == pytest.approx(0.25)
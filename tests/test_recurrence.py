@@ -0,0 +1,55 @@
+from datetime import date, datetime
+
+import pytest
+
+from recurrence import occurrences, parse_dates
+
+
+def test_weekly():
+  times = occurrences(datetime(2026, 1, 1, 20, 0), 'weekly', count=3)
+  assert times == [datetime(2026, 1, 1, 20), datetime(2026, 1, 8, 20), datetime(2026, 1, 15, 20)]
+
+
+def test_interval():
+  times = occurrences(datetime(2026, 1, 1, 20, 0), 'weekly', interval=2, count=3)
+  assert [when.day for when in times] == [1, 15, 29]
+
+
+def test_monthly_skips_months_without_the_day():
+  # like RRULE, the 31st only happens in months that have one
+  times = occurrences(datetime(2026, 1, 31, 21, 0), 'monthly', count=4)
+  assert times == [datetime(2026, 1, 31, 21), datetime(2026, 3, 31, 21),
+                   datetime(2026, 5, 31, 21), datetime(2026, 7, 31, 21)]
+
+
+def test_monthly_on_the_29th_across_february():
+  times = occurrences(datetime(2027, 1, 29, 21, 0), 'monthly', until=date(2027, 4, 30))
+  assert [when.date() for when in times] == [date(2027, 1, 29), date(2027, 3, 29), date(2027, 4, 29)]
+  leap = occurrences(datetime(2028, 1, 29, 21, 0), 'monthly', count=2)
+  assert leap[1] == datetime(2028, 2, 29, 21)
+
+
+def test_until_includes_the_whole_last_day():
+  times = occurrences(datetime(2026, 1, 1, 23, 30), 'weekly', until=date(2026, 1, 15))
+  assert times[-1] == datetime(2026, 1, 15, 23, 30)
+  assert len(times) == 3
+
+
+def test_exceptions_count_towards_count():
+  times = occurrences(datetime(2026, 12, 17, 20, 0), 'weekly', count=3, exceptions=[date(2026, 12, 24)])
+  assert times == [datetime(2026, 12, 17, 20), datetime(2026, 12, 31, 20)]
+
+
+def test_limit_caps_open_ended_series():
+  assert len(occurrences(datetime(2026, 1, 1, 20, 0), 'weekly', limit=10)) == 10
+  assert len(occurrences(datetime(2026, 1, 1, 20, 0), 'weekly', count=5, limit=10)) == 5
+
+
+def test_parse_dates():
+  assert parse_dates('2026-12-31, 2026-12-24 2026-12-24') == [date(2026, 12, 24), date(2026, 12, 31)]
+  assert parse_dates('') == []
+  assert parse_dates(None) == []
+  with pytest.raises(ValueError):
+    parse_dates('2026-02-30')
+  with pytest.raises(ValueError):
+    parse_dates('tomorrow')
@@ -0,0 +1,25 @@
+import pytest
+
+from thumbnails import check_public, KEY, VARIANT
+
+
+@pytest.mark.parametrize('address', ['127.0.0.1', '10.1.2.3', '172.16.0.1', '192.168.1.1', '169.254.169.254',
+                                     '100.64.0.1', '0.0.0.0', '::1', '::ffff:127.0.0.1', 'fe80::1%eth0', 'fd00::1'])
+def test_internal_addresses_are_refused(address):
+  with pytest.raises(ValueError):
+    check_public(address)
+
+
+@pytest.mark.parametrize('address', ['8.8.8.8', '151.101.1.69', '2606:4700::1111'])
+def test_public_addresses_pass(address):
+  check_public(address)
+
+
+def test_variant_paths():
+  assert KEY.fullmatch('0' * 64)
+  assert not KEY.fullmatch('..')
+  assert not KEY.fullmatch('0' * 63 + 'G')
+  assert VARIANT.fullmatch('320.webp').group(1) == 'webp'
+  assert VARIANT.fullmatch('160.jpg')
+  assert not VARIANT.fullmatch('../160.jpg')
+  assert not VARIANT.fullmatch('160.png')
@@ -0,0 +1,217 @@
+#----------------------------------------------------------------------------#
+# Image thumbnails.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import os
+import re
+import ssl
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+try:
+  from PIL import Image
+except ImportError:
+  Image = None
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+# (file extension, PIL format, mimetype)
+FORMATS = (
+  ('webp', 'WEBP', 'image/webp'),
+  ('jpg',  'JPEG', 'image/jpeg'),
+)
+# <sha256>/<width>.<ext>, the only paths a variant can be stored under
+KEY = re.compile(r'[0-9a-f]{64}')
+VARIANT = re.compile(r'[0-9]+\.(%s)' % '|'.join(ext for ext, _, _ in FORMATS))
+
+
+def check_public(address):
+  # image_link is user input: never fetch from loopback, private, link-local
+  # (cloud metadata) or other non-global addresses
+  ip = ipaddress.ip_address(address.split('%', 1)[0])
+  if getattr(ip, 'ipv4_mapped', None):
+    ip = ip.ipv4_mapped
+  if not ip.is_global:
+    raise ValueError('image host is not a public address: %s' % address)
+
+
+class PublicAddressMixin(object):
+  # checks the address actually connected to, so names resolving to an
+  # internal address and redirects to one are refused alike
+
+  def connect(self):
+    super(PublicAddressMixin, self).connect()
+    try:
+      check_public(self.sock.getpeername()[0])
+    except ValueError:
+      self.close()
+      raise
+
+
+class PublicHTTPConnection(PublicAddressMixin, http.client.HTTPConnection):
+  pass
+
+
+class PublicHTTPSConnection(PublicAddressMixin, http.client.HTTPSConnection):
+  pass
+
+
+class PublicHTTPHandler(urllib.request.HTTPHandler):
+
+  def http_open(self, req):
+    return self.do_open(PublicHTTPConnection, req)
+
+
+class PublicHTTPSHandler(urllib.request.HTTPSHandler):
+
+  def https_open(self, req):
+    return self.do_open(PublicHTTPSConnection, req, context=ssl.create_default_context())
+
+
+def public_opener():
+  # http and https only, redirects included, and no proxies from the
+  # environment, whose address would be the one checked
+  opener = urllib.request.OpenerDirector()
+  for handler in (PublicHTTPHandler(), PublicHTTPSHandler(), urllib.request.HTTPRedirectHandler(),
+                  urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+    opener.add_handler(handler)
+  return opener
+
+
+
+class ThumbnailStore(object):
+  # Resized variants of remote images, stored on disk under
+  # <root>/<sha256 of the original bytes>/<width>.<ext>. A manifest maps each
+  # source url to its content hash so templates can build a srcset without
+  # touching the network.
+
+  def __init__(self, root, widths=(160, 320, 640), source_dir=None,
+               timeout=5, max_bytes=10 * 1024 * 1024, max_pixels=25000000, quality=80):
+    self.root = root
+    self.widths = tuple(sorted(widths))
+    self.source_dir = source_dir
+    self.timeout = timeout
+    self.max_bytes = max_bytes
+    self.max_pixels = max_pixels
+    if Image is not None:
+      Image.MAX_IMAGE_PIXELS = max_pixels
+    self.opener = public_opener()
+    self.quality = quality
+    self.manifest_path = os.path.join(root, 'manifest.json')
+    self.manifest = {}
+    self.manifest_mtime = None
+    self.checked_at = 0
+    self.lock = threading.Lock()
+
+  @property
+  def available(self):
+    return Image is not None
+
+  def _reload(self):
+    # other workers write to the same manifest, pick their changes up at most
+    # once a second instead of stat-ing the file on every lookup
+    now = time.monotonic()
+    if now - self.checked_at < 1:
+      return
+    self.checked_at = now
+    try:
+      mtime = os.stat(self.manifest_path).st_mtime
+    except OSError:
+      return
+    if mtime == self.manifest_mtime:
+      return
+    try:
+      with open(self.manifest_path) as f:
+        self.manifest = json.load(f)
+      self.manifest_mtime = mtime
+    except (OSError, ValueError):
+      pass
+
+  def lookup(self, url):
+    if not url:
+      return None
+    self._reload()
+    return self.manifest.get(url)
+
+  def srcset(self, url, ext, prefix):
+    entry = self.lookup(url)
+    if entry is None:
+      return ''
+    return ', '.join('%s/%s/%d.%s %dw' % (prefix, entry['key'], width, ext, width)
+                     for width in entry['widths'])
+
+  def fetch(self, url):
+    parsed = urlparse(url)
+    if self.source_dir:
+      source_dir = os.path.abspath(self.source_dir)
+      path = os.path.abspath(os.path.join(source_dir, parsed.netloc, parsed.path.lstrip('/')))
+      if not path.startswith(source_dir + os.sep):
+        raise ValueError('image path outside of source dir: %s' % url)
+      with open(path, 'rb') as f:
+        data = f.read(self.max_bytes + 1)
+    elif parsed.scheme not in ('http', 'https'):
+      raise ValueError('unsupported image url: %s' % url)
+    else:
+      with self.opener.open(url, timeout=self.timeout) as response:
+        data = response.read(self.max_bytes + 1)
+    if len(data) > self.max_bytes:
+      raise ValueError('image too large: %s' % url)
+    return data
+
+  def generate(self, url):
+    if not url or not self.available:
+      return None
+    data = self.fetch(url)
+    key = hashlib.sha256(data).hexdigest()
+    directory = os.path.join(self.root, key)
+    os.makedirs(directory, exist_ok=True)
+
+    # a small file can still decode to a huge bitmap; the size is known from
+    # the header, before anything is decoded
+    image = Image.open(io.BytesIO(data))
+    if image.width * image.height > self.max_pixels:
+      raise ValueError('image too large: %s' % url)
+    image = image.convert('RGB')
+    # never upscale: keep the widths smaller than the original, and at least
+    # the smallest one so every image gets a thumbnail
+    widths = [w for w in self.widths if w < image.width] or [min(self.widths[0], image.width)]
+    for width in widths:
+      height = max(1, round(image.height * width / image.width))
+      resized = None
+      for ext, fmt, _ in FORMATS:
+        target = os.path.join(directory, '%d.%s' % (width, ext))
+        if os.path.exists(target):
+          continue
+        if resized is None:
+          resized = image.resize((width, height), Image.LANCZOS)
+        tmp = '%s.%d.tmp' % (target, os.getpid())
+        resized.save(tmp, fmt, quality=self.quality)
+        os.replace(tmp, target)
+
+    self._record(url, {'key': key, 'widths': widths})
+    return key
+
+  def _record(self, url, entry):
+    os.makedirs(self.root, exist_ok=True)
+    with self.lock, open(self.manifest_path + '.lock', 'w') as lock:
+      # the manifest is shared by every worker, serialize read-modify-write
+      if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+      self.checked_at = 0
+      self._reload()
+      self.manifest[url] = entry
+      tmp = '%s.%d.tmp' % (self.manifest_path, os.getpid())
+      with open(tmp, 'w') as f:
+        json.dump(self.manifest, f)
+      os.replace(tmp, self.manifest_path)
+      self.manifest_mtime = os.stat(self.manifest_path).st_mtime
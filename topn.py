@@ -0,0 +1,80 @@
+#----------------------------------------------------------------------------#
+# Small top-N lists.
+#----------------------------------------------------------------------------#
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TopN(object):
+  # The n highest-ranked rows (namedtuples with an id), best first. Readers
+  # get an immutable snapshot, so rendering never waits for a writer.
+
+  def __init__(self, n, key):
+    self.n = n
+    self.key = key
+    self.rows = ()
+    self.lock = threading.Lock()
+
+  def replace(self, rows):
+    with self.lock:
+      self.rows = tuple(sorted(rows, key=self.key, reverse=True)[:self.n])
+
+  def offer(self, row):
+    # adds or updates a row; it only stays if it ranks in the top n
+    with self.lock:
+      rows = [existing for existing in self.rows if existing.id != row.id] + [row]
+      self.rows = tuple(sorted(rows, key=self.key, reverse=True)[:self.n])
+
+  def update(self, id, **fields):
+    with self.lock:
+      self.rows = tuple(row._replace(**fields) if row.id == id else row for row in self.rows)
+
+  def discard(self, id):
+    # True when the row was listed, the list is then one short until the
+    # next refresh
+    with self.lock:
+      rows = tuple(row for row in self.rows if row.id != id)
+      removed = len(rows) != len(self.rows)
+      self.rows = rows
+    return removed
+
+  def __iter__(self):
+    return iter(self.rows)
+
+  def __len__(self):
+    return len(self.rows)
+
+
+class Refresher(threading.Thread):
+  # Calls refresh() every `interval` seconds, and within `delay` seconds of
+  # mark_stale() so bursts of changes cost one refresh.
+
+  def __init__(self, refresh, interval=300, delay=5):
+    super(Refresher, self).__init__(name='refresher', daemon=True)
+    self.refresh = refresh
+    self.interval = interval
+    self.delay = delay
+    self.stale = threading.Event()
+    self.stopped = threading.Event()
+
+  def mark_stale(self):
+    self.stale.set()
+
+  def stop(self):
+    self.stopped.set()
+    self.stale.set()
+
+  def run(self):
+    while not self.stopped.is_set():
+      if self.stale.wait(self.interval):
+        self.stopped.wait(self.delay)
+      self.stale.clear()
+      if self.stopped.is_set():
+        break
+      try:
+        self.refresh()
+      except Exception:
+        logger.exception('refresh failed')
@@ -0,0 +1,99 @@
+#----------------------------------------------------------------------------#
+# View models.
+#----------------------------------------------------------------------------#
+
+# Rows handed to templates and JSON responses. They are built straight from
+# column-only query rows with _make(), so listing pages never hydrate full
+# ORM objects, and templates read them like the dicts they replace.
+
+import json
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+
+class ShowRow(NamedTuple):
+  id: int
+  venue_id: int
+  venue_name: str
+  artist_id: int
+  artist_name: str
+  artist_image_link: Optional[str]
+  start_time: datetime
+  series_id: Optional[int]
+
+
+class NearbyShow(NamedTuple):
+  id: int
+  venue_id: int
+  venue_name: str
+  artist_id: int
+  artist_name: str
+  artist_image_link: Optional[str]
+  start_time: datetime
+  series_id: Optional[int]
+  distance_km: float
+
+
+class ArtistShow(NamedTuple):
+  # a show listed on a venue's page
+  artist_id: int
+  artist_name: str
+  artist_image_link: Optional[str]
+  start_time: datetime
+
+
+class VenueShow(NamedTuple):
+  # a show listed on an artist's page
+  venue_id: int
+  venue_name: str
+  venue_image_link: Optional[str]
+  start_time: datetime
+
+
+class Listing(NamedTuple):
+  id: int
+  name: str
+  num_upcoming_shows: int
+
+
+class NameRow(NamedTuple):
+  id: int
+  name: str
+
+
+class StatRow(NamedTuple):
+  # id is the venue or artist id, or the grouped value itself
+  id: object
+  label: object
+  show_count: int
+
+
+def default(value):
+  if hasattr(value, '_asdict'):
+    return value._asdict()
+  if isinstance(value, (date, datetime)):
+    return value.isoformat()
+  raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def dumps(value):
+  # bytes; orjson when it is installed, the standard library otherwise
+  if orjson is not None:
+    return orjson.dumps(value, default=default)
+  return json.dumps(to_primitive(value), default=default).encode('utf-8')
+
+
+def to_primitive(value):
+  # the json module writes tuples, named or not, as arrays
+  if hasattr(value, '_asdict'):
+    return {key: to_primitive(item) for key, item in value._asdict().items()}
+  if isinstance(value, dict):
+    return {key: to_primitive(item) for key, item in value.items()}
+  if isinstance(value, (list, tuple)):
+    return [to_primitive(item) for item in value]
+  return value
@@ -0,0 +1,121 @@
+#----------------------------------------------------------------------------#
+# Worker warm-up.
+#----------------------------------------------------------------------------#
+
+import collections
+import logging
+import os
+import threading
+import time
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class AccessList(object):
+  # Counts the pages this worker serves and merges the counts into a file
+  # shared by every worker, "count path" per line, most requested first.
+  # New workers pre-render the top of the list before they report ready.
+
+  def __init__(self, path, size=200):
+    self.path = path
+    self.size = size
+    self.counts = collections.Counter()
+    self.lock = threading.Lock()
+
+  def record(self, path):
+    with self.lock:
+      self.counts[path] += 1
+
+  def read(self):
+    counts = collections.Counter()
+    try:
+      with open(self.path) as f:
+        for line in f:
+          count, _, path = line.rstrip('\n').partition(' ')
+          if path:
+            counts[path] += int(count)
+    except (OSError, ValueError):
+      pass
+    return counts
+
+  def flush(self):
+    with self.lock:
+      counts, self.counts = self.counts, collections.Counter()
+    if not counts:
+      return
+    directory = os.path.dirname(self.path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    with open(self.path + '.lock', 'w') as lock:
+      # read-modify-write of a file every worker writes to
+      if fcntl is not None:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+      counts.update(self.read())
+      tmp = '%s.%d.tmp' % (self.path, os.getpid())
+      with open(tmp, 'w') as f:
+        for path, count in counts.most_common(self.size):
+          f.write('%d %s\n' % (count, path))
+      os.replace(tmp, self.path)
+
+  def top(self, n):
+    return [path for path, _ in self.read().most_common(n)]
+
+
+class Warmup(object):
+  # Runs named steps in order and remembers how each went for the readiness
+  # check. A failing step is logged and skipped: a worker with a cold cache
+  # is still better than one that never becomes ready. Only when one of the
+  # `required` steps fails does the worker stay unready, and the next
+  # start() runs the warm-up again.
+
+  def __init__(self, steps, required=()):
+    self.steps = steps
+    self.required = set(required)
+    self.started = False
+    self.ready = threading.Event()
+    self.current = None
+    self.timings = collections.OrderedDict()
+    self.errors = {}
+    self.lock = threading.Lock()
+
+  def start(self, background=True):
+    with self.lock:
+      if self.started:
+        return
+      self.started = True
+    if background:
+      threading.Thread(target=self.run, name='warm-up', daemon=True).start()
+    else:
+      self.run()
+
+  def run(self):
+    errors = {}
+    for name, step in self.steps:
+      self.current = name
+      start = time.perf_counter()
+      try:
+        step()
+      except Exception as e:
+        logger.exception('warm-up step %s failed', name)
+        errors[name] = str(e)
+      self.timings[name] = time.perf_counter() - start
+    self.errors = errors
+    self.current = None
+    if self.required.intersection(errors):
+      with self.lock:
+        self.started = False
+    else:
+      self.ready.set()
+
+  def status(self):
+    return {
+      'ready': self.ready.is_set(),
+      'step': self.current,
+      'timings': {name: round(seconds, 3) for name, seconds in self.timings.items()},
+      'errors': self.errors,
+    }